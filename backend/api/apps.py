@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if settings.INSTRUMENTATION_SAMPLE_RATE > 0:
+            from foodgram.middleware import instrument_serializers
+            instrument_serializers()
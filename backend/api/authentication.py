@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from foodgram.routers import use_primary
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+TOKEN_KEY = 'auth_token:{}'
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+
+
+class TokenCache:
+    """Снимки token → user: ограниченный LRU в памяти процесса
+    и общий кеш с TTL. Пароль в снимок не попадает."""
+
+    def __init__(self, size, local_ttl, shared_ttl):
+        self.size = size
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def shared_key(key):
+        return TOKEN_KEY.format(sha256(key.encode()).hexdigest())
+
+    @staticmethod
+    def snapshot(token, user):
+        return (
+            token.created,
+            tuple(getattr(user, field) for field in USER_FIELDS),
+        )
+
+    @staticmethod
+    def restore(key, snapshot):
+        created, values = snapshot
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        token = Token.from_db(
+            DEFAULT_DB_ALIAS, ('key', 'user_id', 'created'),
+            (key, user.pk, created)
+        )
+        token.user = user
+        return user, token
+
+    def _remember(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, snapshot = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return self.restore(key, snapshot)
+                del self._entries[key]
+        snapshot = cache.get(self.shared_key(key))
+        if snapshot is None:
+            return None
+        self._remember(key, snapshot)
+        return self.restore(key, snapshot)
+
+    def set(self, token, user):
+        snapshot = self.snapshot(token, user)
+        cache.set(self.shared_key(token.key), snapshot, self.shared_ttl)
+        self._remember(token.key, snapshot)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        cache.delete_many([self.shared_key(key) for key in keys])
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE,
+    settings.AUTH_TOKEN_LOCAL_TTL,
+    settings.AUTH_TOKEN_CACHE_TTL,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый запрос.
+
+    Выход через djoser удаляет токен, а смена пароля сохраняет
+    пользователя — оба события сбрасывают снимок (api.signals).
+    Другие процессы могут помнить снимок не дольше
+    AUTH_TOKEN_LOCAL_TTL секунд. Промах читается с основной базы:
+    только что выданного токена на реплике может еще не быть."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        with use_primary():
+            user, token = super().authenticate_credentials(key)
+        token_cache.set(token, user)
+        return user, token
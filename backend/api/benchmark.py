@@ -0,0 +1,380 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import (close_old_connections, connection, connections,
+                       transaction)
+from django.db.backends.signals import connection_created
+from django.test.utils import CaptureQueriesContext
+from foodgram.handlers import ASGIHandler
+from recipes.importers import import_ingredients, read_csv
+from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+BASELINE_PATH = os.path.join(settings.BASE_DIR, 'data', 'bench_baseline.json')
+INGREDIENTS_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+TABLE_ALIAS = re.compile(r'"(\w+)" (?:AS )?([A-Z]\d+)')
+INDEXED_TABLES = (
+    Favorite._meta.db_table,
+    ShoppingCart._meta.db_table,
+    Subscribe._meta.db_table,
+)
+
+
+class DatasetFactory:
+    """Синтетические данные: пользователи, рецепты, избранное,
+    корзины и подписки. Одинаковый seed дает одинаковый набор."""
+
+    def __init__(self, users=50, recipes=300, ingredients_per_recipe=8,
+                 seed=0):
+        self.users = users
+        self.recipes = recipes
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.random = random.Random(seed)
+
+    def make_users(self):
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(email=f'bench{i}@foodgram.ru', username=f'bench{i}',
+                 first_name='Бенч', last_name=f'{i}', password=password)
+            for i in range(self.users)
+        )
+        return list(User.objects.order_by('id'))
+
+    def make_recipes(self, authors, tags, ingredients):
+        Recipe.objects.bulk_create(
+            Recipe(author=self.random.choice(authors), name=f'Рецепт {i}',
+                   text='Описание ' * 20, cooking_time=i % 120 + 1,
+                   image='recipes/image/bench.png')
+            for i in range(self.recipes)
+        )
+        recipes = list(Recipe.objects.order_by('id'))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in self.random.sample(tags, self.random.randint(1, 2))
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=self.random.randint(1, 50))
+            for recipe in recipes
+            for ingredient in self.random.sample(
+                ingredients, self.ingredients_per_recipe)
+        )
+        return recipes
+
+    def make_relations(self, users, recipes):
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in self.random.sample(recipes, 10)
+            )
+        Subscribe.objects.bulk_create(
+            Subscribe(user=user, author=author)
+            for user in users
+            for author in self.random.sample(users, min(10, len(users)))
+            if author != user
+        )
+
+    def seed(self):
+        call_command('fromcsv_tags', stdout=StringIO())
+        with open(INGREDIENTS_PATH, newline='', encoding='utf-8') as f:
+            import_ingredients(read_csv(f))
+        users = self.make_users()
+        recipes = self.make_recipes(
+            users, list(Tag.objects.all()),
+            list(Ingredient.objects.only('id'))
+        )
+        self.make_relations(users, recipes)
+        call_command('recount', stdout=StringIO())
+        call_command('rebuild_timelines', stdout=StringIO())
+        return users[0]
+
+
+def scenarios(user):
+    """(название, клиент, url) для каждого замера."""
+    anonymous = APIClient()
+    authenticated = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    authenticated.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    author = Recipe.objects.values_list('author_id', flat=True).first()
+    tag = Tag.objects.values_list('slug', flat=True).first()
+    pantry = ','.join(
+        str(pk) for pk in AmountIngredient.objects.values_list(
+            'ingredient_id', flat=True
+        )[:20]
+    )
+    return (
+        ('recipes_anonymous', anonymous, '/api/recipes/'),
+        ('recipes_authenticated', authenticated, '/api/recipes/'),
+        ('recipes_cursor', authenticated, '/api/recipes/?cursor='),
+        ('recipes_by_tag', authenticated, f'/api/recipes/?tags={tag}'),
+        ('recipes_by_author', authenticated,
+         f'/api/recipes/?author={author}'),
+        ('recipes_favorited', authenticated, '/api/recipes/?is_favorited=1'),
+        ('recipes_search', authenticated, '/api/recipes/?search=рецепт'),
+        ('recipes_feed', authenticated, '/api/recipes/feed/'),
+        ('recipes_match', anonymous, f'/api/recipes/match/?have={pantry}'),
+        ('subscriptions', authenticated,
+         '/api/users/subscriptions/?recipes_limit=3'),
+        ('download_shopping_cart', authenticated,
+         '/api/recipes/download_shopping_cart/'),
+        ('ingredients_search', anonymous, '/api/ingredients/?name=са'),
+        ('ingredients_autocomplete', anonymous,
+         '/api/ingredients/autocomplete/?name=са'),
+    )
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[index]
+
+
+def measure(client, url, iterations):
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise AssertionError(f'{url}: {response.status_code}')
+        queries = max(queries, len(context))
+    return {
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+    }
+
+
+def connection_overhead(client, url, iterations, max_age):
+    """Задержки url, когда после каждого запроса соединения
+    закрываются или остаются открытыми по CONN_MAX_AGE = max_age,
+    как в gunicorn (тестовый клиент этого не делает), и сколько
+    раз за замер Django подключался к базе."""
+    connects = []
+
+    def count(sender, connection, **kwargs):
+        connects.append(connection.alias)
+
+    saved = {}
+    for db in connections.all():
+        db.close()
+        saved[db.alias] = db.settings_dict['CONN_MAX_AGE']
+        db.settings_dict['CONN_MAX_AGE'] = max_age
+    connection_created.connect(count)
+    timings = []
+    try:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise AssertionError(f'{url}: {response.status_code}')
+            close_old_connections()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection_created.disconnect(count)
+        for db in connections.all():
+            db.close()
+            db.settings_dict['CONN_MAX_AGE'] = saved[db.alias]
+    return {
+        'connects': len(connects),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+    }
+
+
+def http_scope(url, token=None):
+    path, _, query = url.partition('?')
+    headers = [(b'host', b'testserver')]
+    if token is not None:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': headers,
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+
+def summary(timings, elapsed):
+    return {
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+    }
+
+
+def wsgi_concurrency(scope, clients, workers, delay):
+    """clients одновременных запросов к пулу из workers синхронных
+    воркеров: воркер занят, пока медленный клиент (delay секунд)
+    забирает ответ."""
+    handler = WSGIHandler()
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    def serve(submitted):
+        response = handler(ASGIHandler.environ(scope, b''), start_response)
+        try:
+            b''.join(response)
+            time.sleep(delay)
+        finally:
+            response.close()
+        return time.perf_counter() - submitted
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(serve, time.perf_counter())
+                   for _ in range(clients)]
+        timings = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+    failed = [status for status in statuses if not status.startswith('200')]
+    if failed:
+        raise AssertionError(f'{scope["path"]}: {failed[0]}')
+    return summary(timings, elapsed)
+
+
+def asgi_concurrency(scope, clients, workers, delay):
+    """То же через ASGIHandler с пулом из workers потоков: медленную
+    отправку ответа ждет цикл событий, а не поток."""
+    handler = ASGIHandler(workers)
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+        elif not message.get('more_body'):
+            await asyncio.sleep(delay)
+
+    async def request():
+        submitted = time.perf_counter()
+        await handler(scope, receive, send)
+        return time.perf_counter() - submitted
+
+    async def run():
+        return await asyncio.gather(*(request() for _ in range(clients)))
+
+    started = time.perf_counter()
+    try:
+        timings = asyncio.run(run())
+    finally:
+        handler.executor.shutdown()
+    elapsed = time.perf_counter() - started
+    failed = [status for status in statuses if status != 200]
+    if failed:
+        raise AssertionError(f'{scope["path"]}: {failed[0]}')
+    return summary(timings, elapsed)
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def regressions(results, baseline, tolerance=None, min_delta_ms=2.0):
+    """Больше запросов, чем в базовой линии. С tolerance еще и p95
+    медленнее допуска (и не меньше чем на min_delta_ms, чтобы не ловить
+    шум): задержки из базовой линии сравнимы только на той же машине."""
+    found = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            found.append(
+                f'{name}: запросов {result["queries"]}, '
+                f'было {expected["queries"]}'
+            )
+        if tolerance is None:
+            continue
+        limit = max(expected['p95_ms'] * (1 + tolerance),
+                    expected['p95_ms'] + min_delta_ms)
+        if result['p95_ms'] > limit:
+            found.append(
+                f'{name}: p95 {result["p95_ms"]} мс, '
+                f'было {expected["p95_ms"]} мс'
+            )
+    return found
+
+
+def sequential_scans(sql):
+    """Таблицы из INDEXED_TABLES, которые план читает целиком."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            nodes = [cursor.fetchone()[0][0]['Plan']]
+            scanned = set()
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    scanned.add(node['Relation Name'])
+                nodes.extend(node.get('Plans', ()))
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            aliases = dict(
+                (alias, table) for table, alias in TABLE_ALIAS.findall(sql)
+            )
+            scanned = {
+                aliases.get(name, name) for name in (
+                    detail.replace('SCAN TABLE ', 'SCAN ').split()[1]
+                    for *_, detail in cursor.fetchall()
+                    if detail.startswith('SCAN')
+                )
+            }
+    return scanned & set(INDEXED_TABLES)
+
+
+def explain(client, url):
+    """Запросы сценария, которые обходят индексы INDEXED_TABLES."""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    found = []
+    for query in context.captured_queries:
+        sql = query['sql']
+        if not sql.startswith('SELECT'):
+            continue
+        with transaction.atomic():
+            tables = sequential_scans(sql)
+        if tables:
+            found.append(f'{url}: {", ".join(sorted(tables))}: {sql}')
+    return found
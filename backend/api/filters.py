@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.search import search_recipes
 
 User = get_user_model()
 
@@ -17,16 +19,19 @@ class IngredientFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
+    """Все условия добавляются к входящему queryset через EXISTS,
+    без JOIN-ов, поэтому строки не дублируются и DISTINCT не нужен."""
     is_favorited = filters.NumberFilter(method='get_is_favorited')
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_in_shopping_cart = filters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
     tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='get_tags',
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
@@ -34,19 +39,43 @@ class RecipeFilter(filters.FilterSet):
             'is_favorited',
             'author',
             'is_in_shopping_cart',
-            'tags'
+            'tags',
+            'search',
         )
 
+    def filter_exists(self, queryset, name, subquery):
+        if name not in queryset.query.annotations:
+            queryset = queryset.annotate(**{name: Exists(subquery)})
+        return queryset.filter(**{name: True})
+
     def get_is_favorited(self, queryset, name, value):
-        if value:
-            return Recipe.objects.filter(
-                favorites__user=self.request.user
-            )
-        return Recipe.objects.all()
+        if not value:
+            return queryset
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return self.filter_exists(queryset, name, Favorite.objects.filter(
+            user=self.request.user, recipe=OuterRef('pk')
+        ))
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return Recipe.objects.filter(
-                shopping_cart__user=self.request.user
+        if not value:
+            return queryset
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return self.filter_exists(queryset, name, ShoppingCart.objects.filter(
+            user=self.request.user, recipe=OuterRef('pk')
+        ))
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return self.filter_exists(
+            queryset, 'has_tags', Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=value
             )
-        return Recipe.objects.all()
+        )
+
+    def get_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
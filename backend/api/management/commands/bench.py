@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmark import (BASELINE_PATH, DatasetFactory, asgi_concurrency,
+                           connection_overhead, explain, http_scope,
+                           load_baseline, measure, regressions, save_baseline,
+                           scenarios, wsgi_concurrency)
+
+CONNECTIONS_URL = '/api/ingredients/?name=са'
+CONCURRENCY_URL = '/api/recipes/download_shopping_cart/'
+
+
+class Command(BaseCommand):
+    help = 'Замеряем задержки и число SQL-запросов основных эндпоинтов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=300)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=BASELINE_PATH)
+        parser.add_argument(
+            '--check-latency',
+            action='store_true',
+            help='Кроме числа запросов сравнивать p95 с базовой линией '
+                 '(только если она записана на этой же машине)',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.5,
+            help='Допустимое замедление p95 при --check-latency',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Проверить по EXPLAIN, что запросы идут по индексам',
+        )
+        parser.add_argument(
+            '--connections',
+            action='store_true',
+            help='Сравнить подключение к базе на каждый запрос '
+                 'с постоянными соединениями из настроек',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=0,
+            help='Сравнить WSGI и ASGI при стольких одновременных '
+                 'медленных клиентах',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.ASGI_THREADS,
+            help='Синхронных воркеров WSGI и потоков ASGI',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=50,
+            help='Сколько миллисекунд медленный клиент забирает ответ',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Записать результаты как новую базовую линию',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            if options['explain']:
+                self.explain(options)
+                return
+            if options['connections']:
+                self.connections(options)
+                return
+            if options['concurrency']:
+                self.concurrency(options)
+                return
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if options['save_baseline']:
+            save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS('Базовая линия сохранена'))
+            return
+        found = regressions(
+            results, load_baseline(options['baseline']),
+            options['tolerance'] if options['check_latency'] else None
+        )
+        if found:
+            raise CommandError('Регрессии:\n' + '\n'.join(found))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def seed(self, options):
+        return DatasetFactory(
+            users=options['users'],
+            recipes=options['recipes'],
+            seed=options['seed'],
+        ).seed()
+
+    def explain(self, options):
+        found = []
+        for name, client, url in scenarios(self.seed(options)):
+            found.extend(explain(client, url))
+        if found:
+            raise CommandError('Полный просмотр таблиц:\n' + '\n'.join(found))
+        self.stdout.write(self.style.SUCCESS('Все запросы идут по индексам'))
+
+    def connections(self, options):
+        self.seed(options)
+        client = APIClient()
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        self.stdout.write(
+            f'{"CONN_MAX_AGE":<28}{"подключений":>12}{"p50":>9}{"p95":>9}'
+        )
+        results = []
+        for max_age in (0, configured):
+            result = connection_overhead(
+                client, CONNECTIONS_URL, options['iterations'], max_age
+            )
+            results.append(result)
+            self.stdout.write(
+                f'{max_age:<28}{result["connects"]:>12}'
+                f'{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+            )
+        overhead = results[0]['p50_ms'] - results[1]['p50_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f'Подключение к базе: {overhead:.2f} мс на запрос (p50)'
+        ))
+
+    def concurrency(self, options):
+        token, _ = Token.objects.get_or_create(user=self.seed(options))
+        scope = http_scope(CONCURRENCY_URL, token.key)
+        clients = options['concurrency']
+        workers = options['workers']
+        delay = options['client_delay'] / 1000
+        self.stdout.write(
+            f'{CONCURRENCY_URL}: клиентов {clients}, потоков {workers}, '
+            f'клиент читает ответ {options["client_delay"]:g} мс'
+        )
+        self.stdout.write(f'{"путь":<28}{"rps":>9}{"p50":>9}{"p95":>9}')
+        for name, benchmark in (('wsgi', wsgi_concurrency),
+                                ('asgi', asgi_concurrency)):
+            result = benchmark(scope, clients, workers, delay)
+            self.stdout.write(
+                f'{name:<28}{result["rps"]:>9}'
+                f'{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+            )
+
+    def run(self, options):
+        user = self.seed(options)
+        results = {}
+        self.stdout.write(
+            f'{"сценарий":<28}{"запросы":>8}{"p50":>9}{"p95":>9}{"p99":>9}'
+        )
+        for name, client, url in scenarios(user):
+            result = measure(client, url, options['iterations'])
+            results[name] = result
+            self.stdout.write(
+                f'{name:<28}{result["queries"]:>8}{result["p50_ms"]:>9}'
+                f'{result["p95_ms"]:>9}{result["p99_ms"]:>9}'
+            )
+        return results
@@ -1,5 +1,111 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from recipes.feed import timeline_page
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPagination(PageNumberPagination):
-    page_query_param = 'limit'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (pub_date, id) без COUNT и OFFSET:
+    каждая страница — диапазонное чтение по индексу."""
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode()
+            ).decode().rsplit('|', 1)
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def encode_cursor(self, position):
+        pub_date, pk = position
+        position = f'{pub_date.isoformat()}|{pk}'
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by('-pub_date', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(pub_date__lte=pub_date).exclude(
+                pub_date=pub_date, id__gte=pk
+            )
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = (page[-1].pub_date, page[-1].pk) if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(KeysetPagination):
+    """Лента подписок: страница ключей из timeline_page, затем
+    рецепты этой страницы одним запросом."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        positions = timeline_page(
+            request.user, self.decode_cursor(request), self.page_size + 1
+        )
+        self.has_next = len(positions) > self.page_size
+        positions = positions[:self.page_size]
+        self.last = positions[-1] if positions else None
+        recipes = queryset.in_bulk([pk for _, pk in positions])
+        return [recipes[pk] for _, pk in positions if pk in recipes]
+
+
+class RecipePagination(LimitPagination):
+    """Номера страниц для фронтенда; с параметром cursor —
+    пагинация по ключу для бесконечной ленты. Результаты поиска
+    упорядочены по релевантности, а не по (pub_date, id), поэтому
+    для них cursor игнорируется."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (KeysetPagination.cursor_query_param in request.query_params
+                and 'search_rank' not in queryset.query.annotations):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
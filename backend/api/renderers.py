@@ -0,0 +1,59 @@
+import csv
+import json
+
+from foodgram.utils import EchoBuffer
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Построчно отдает список покупок из (название, единица, количество)."""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+
+class ShoppingListTxtRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield 'Список покупок: \n'
+        for name, measure, amount in ingredients:
+            yield f'{name}({measure}) — {amount}\n'
+
+
+class ShoppingListCsvRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in ingredients:
+            yield writer.writerow(row)
+
+
+class ShoppingListJsonRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        separator = '['
+        for name, measure, amount in ingredients:
+            yield separator + json.dumps(
+                {'name': name, 'measurement_unit': measure, 'amount': amount},
+                ensure_ascii=False
+            )
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTxtRenderer,
+    ShoppingListCsvRenderer,
+    ShoppingListJsonRenderer,
+)
@@ -1,14 +1,24 @@
-from django.shortcuts import get_object_or_404
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import AmountIngredient, Favorite, Ingredient, Recipe, Tag
+from recipes.cache import bump_shopping_cart_version
+from recipes.images import rendition_name, schedule_renditions
+from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from recipes.pantry import pantry_index
+from recipes.search import index_recipe
+from rest_framework.exceptions import NotFound
 from rest_framework.serializers import (CharField, CurrentUserDefault,
-                                        HiddenField, IntegerField,
+                                        FloatField, HiddenField, ImageField,
+                                        IntegerField, ListField,
                                         ModelSerializer,
                                         PrimaryKeyRelatedField, Serializer,
                                         SerializerMethodField)
 from users.models import Subscribe, User
 
+RECIPE_BATCH_LIMIT = 100
+
 
 class BaseUserCreateSerializer(UserCreateSerializer):
     class Meta:
@@ -38,6 +48,9 @@ class BaseUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -49,8 +62,39 @@ class PasswordSerializer(Serializer):
     current_password = CharField(required=True)
 
 
+class RecipeIdsSerializer(Serializer):
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_LIMIT,
+    )
+
+
+class RenditionImageField(ImageField):
+    """Ссылка на уменьшенную копию картинки рецепта; пока копии
+    не готовы — на оригинал. Вариант можно переопределить через
+    image_rendition в контексте."""
+
+    def __init__(self, rendition='thumbnail', **kwargs):
+        self.rendition = rendition
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        if not getattr(value.instance, 'has_renditions', False):
+            return super().to_representation(value)
+        rendition = self.context.get('image_rendition', self.rendition)
+        url = default_storage.url(rendition_name(value.name, rendition))
+        request = self.context.get('request')
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+
 class SubscribeRecipeSerializer(ModelSerializer):
-    image = Base64ImageField()
+    image = RenditionImageField()
 
     class Meta:
         model = Recipe
@@ -65,27 +109,27 @@ class SubscribeRecipeSerializer(ModelSerializer):
 class SubscribeSerializer(ModelSerializer):
     is_subscribed = SerializerMethodField()
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context['request'].user
         if user.is_anonymous:
             return False
-        return Subscribe.objects.filter(user=obj, author=user).exists()
+        return Subscribe.objects.filter(user=user, author=obj).exists()
 
     def get_recipes(self, obj):
-        limit = self.context['request'].query_params.get('recipe_limit')
+        limit = self.context['request'].query_params.get('recipes_limit')
         recipes = obj.recipes.all()
-        if limit:
-            recipes = obj.recipes.all[:int(limit)]
+        if limit and limit.isdigit():
+            recipes = recipes[:int(limit)]
         return SubscribeRecipeSerializer(
             recipes,
             many=True,
+            context=self.context,
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     class Meta:
         model = User
         fields = (
@@ -150,6 +194,8 @@ class IngredientSerializer(ModelSerializer):
 
 
 class FavoriteSerializer(ModelSerializer):
+    image = RenditionImageField()
+
     class Meta:
         model = Recipe
         fields = (
@@ -178,19 +224,31 @@ class RecipeListSerializer(ModelSerializer):
                                                  source='amount_ingredient')
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
+    image = RenditionImageField('card')
 
     def get_is_favorited(self, obj):
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
-        return Recipe.objects.filter(shopping_cart__user=user,
-                                     id=obj.id).exists()
+        return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
+
+    def to_representation(self, instance):
+        is_author_subscribed = getattr(instance, 'is_author_subscribed', None)
+        if is_author_subscribed is not None and instance.author:
+            instance.author.is_subscribed = is_author_subscribed
+        return super().to_representation(instance)
 
     class Meta:
         model = Recipe
@@ -214,41 +272,88 @@ class RecipeCreateSerializer(ModelSerializer):
     image = Base64ImageField()
     author = HiddenField(default=CurrentUserDefault())
 
-    def _add_ingredients(self, recipe, ingredients_data):
-        AmountIngredient.objects.bulk_create(
-            [AmountIngredient(ingredient=get_object_or_404(
-                Ingredient, id=ingredient_item.get('id')),
-                recipe=recipe,
-                amount=ingredient_item.get(
-                    'amount')) for ingredient_item in ingredients_data]
+    def _set_ingredients(self, recipe, ingredients_data, current=()):
+        """Сравнивает новые ингредиенты с текущими строками и пишет
+        только разницу: вставки, изменения количества и удаления."""
+        amounts = {item['id']: item['amount'] for item in ingredients_data}
+        ingredients = Ingredient.objects.in_bulk(amounts)
+        not_found = amounts.keys() - ingredients.keys()
+        if not_found:
+            raise NotFound(
+                'Ингредиенты не найдены: '
+                + ', '.join(map(str, sorted(not_found)))
+            )
+        current = {row.ingredient_id: row for row in current}
+        created = [
+            AmountIngredient(recipe=recipe, ingredient=ingredients[pk],
+                             amount=amount)
+            for pk, amount in amounts.items() if pk not in current
+        ]
+        updated = []
+        deleted = []
+        for pk, row in current.items():
+            if pk not in amounts:
+                deleted.append(row.pk)
+            elif row.amount != amounts[pk]:
+                row.amount = amounts[pk]
+                updated.append(row)
+        if deleted:
+            AmountIngredient.objects.filter(pk__in=deleted).delete()
+        if updated:
+            AmountIngredient.objects.bulk_update(updated, ('amount',))
+        if created:
+            AmountIngredient.objects.bulk_create(created)
+        return created, updated, deleted
+
+    def _index_ingredients(self, recipe, ingredients_data):
+        ingredients = {item['id'] for item in ingredients_data}
+        transaction.on_commit(
+            lambda: pantry_index.update_recipe(recipe.pk, ingredients)
         )
 
     def get_ingredients(self, obj):
         ingredients = AmountIngredient.objects.filter(recipe=obj)
         return AmountIngredientListSerializer(ingredients).data
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
-        self._add_ingredients(recipe, ingredients_data)
+        self._set_ingredients(recipe, ingredients_data)
+        self._index_ingredients(recipe, ingredients_data)
+        index_recipe(recipe)
+        schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
+        if 'image' in validated_data:
+            validated_data['has_renditions'] = False
         super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
-        for tag in tags_data:
-            tag_id = tag.id
-            tag_object = get_object_or_404(Tag, id=tag_id)
-            instance.tags.add(tag_object)
-        self._add_ingredients(instance, ingredients_data)
+        if 'image' in validated_data:
+            schedule_renditions(instance)
+        instance.tags.set(tags_data)
+        created, updated, deleted = self._set_ingredients(
+            instance, ingredients_data,
+            AmountIngredient.objects.filter(recipe=instance)
+        )
+        if created or deleted:
+            self._index_ingredients(instance, ingredients_data)
+        index_recipe(instance)
+        if created or updated or deleted:
+            bump_shopping_cart_version(*ShoppingCart.objects.filter(
+                recipe=instance
+            ).values_list('user_id', flat=True))
         return instance
 
     def to_representation(self, instance):
+        view = self.context.get('view')
+        if view is not None:
+            instance = view.get_queryset().get(pk=instance.pk)
         serializer = RecipeListSerializer(
             instance,
             context=self.context
@@ -268,9 +373,22 @@ class RecipeCreateSerializer(ModelSerializer):
         )
 
 
+class RecipeMatchSerializer(FavoriteSerializer):
+    coverage = FloatField(read_only=True)
+    missing_ingredients = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(FavoriteSerializer.Meta):
+        fields = FavoriteSerializer.Meta.fields + (
+            'coverage',
+            'missing_ingredients',
+        )
+
+
 class ShoppingCartSerializer(ModelSerializer):
+    image = RenditionImageField()
+
     class Meta:
-        model = Ingredient
+        model = Recipe
         fields = (
             'id',
             'name',
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users.models import User
+
+ME_URL = '/api/users/me/'
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    """Снимок токена в кеше не переживает выход, смену пароля
+    и деактивацию пользователя."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия', password='old-Pass-42'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assert_status(200)
+
+    def assert_status(self, status_code):
+        self.assertEqual(self.client.get(ME_URL).status_code, status_code)
+
+    def test_cache_hit_skips_token_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assert_status(200)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if Token._meta.db_table in query['sql']
+        ])
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_status(401)
+
+    def test_set_password(self):
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'old-Pass-42',
+            'new_password': 'new-Pass-42',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.assert_status(401)
+
+    def test_deactivated_user(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assert_status(401)
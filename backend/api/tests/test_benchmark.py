@@ -0,0 +1,22 @@
+from unittest import TestCase
+
+from api.benchmark import regressions
+
+BASELINE = {'recipes': {'queries': 4, 'p95_ms': 10.0}}
+
+
+class RegressionsTest(TestCase):
+
+    def test_slower_machine_passes_by_default(self):
+        results = {'recipes': {'queries': 4, 'p95_ms': 40.0}}
+        self.assertEqual(regressions(results, BASELINE), [])
+
+    def test_extra_queries_fail(self):
+        results = {'recipes': {'queries': 5, 'p95_ms': 10.0}}
+        self.assertEqual(len(regressions(results, BASELINE)), 1)
+
+    def test_latency_checked_with_tolerance(self):
+        results = {'recipes': {'queries': 4, 'p95_ms': 40.0}}
+        self.assertEqual(len(regressions(results, BASELINE, 0.5)), 1)
+        results = {'recipes': {'queries': 4, 'p95_ms': 14.0}}
+        self.assertEqual(regressions(results, BASELINE, 0.5), [])
@@ -0,0 +1,56 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+from recipes.models import Recipe, Tag
+from rest_framework.test import APITestCase
+from users.models import User
+
+
+class RecipeConditionalGetTest(APITestCase):
+    """Рецепт показывает теги, ингредиенты и профиль автора, поэтому
+    их изменение должно сбрасывать ETag и Last-Modified рецепта."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        self.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+        recipe.tags.add(self.tag)
+        self.url = f'/api/recipes/{recipe.pk}/'
+
+    def assert_changed(self, change):
+        response = self.client.get(self.url)
+        etag, modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code,
+            304
+        )
+        # Last-Modified точен до секунды: изменение «позже» на две.
+        later = timezone.now() + timedelta(seconds=2)
+        with mock.patch('recipes.cache.timezone.now', return_value=later):
+            change()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_tag_rename(self):
+        self.tag.name = 'Обед'
+        response = self.assert_changed(self.tag.save)
+        self.assertEqual(response.data['tags'][0]['name'], 'Обед')
+
+    def test_author_profile_change(self):
+        self.author.first_name = 'Повар'
+        response = self.assert_changed(self.author.save)
+        self.assertEqual(response.data['author']['first_name'], 'Повар')
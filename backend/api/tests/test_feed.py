@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from recipes.feed import follow
+from recipes.models import Recipe, TimelineEntry
+from rest_framework.test import APIClient, APITransactionTestCase
+from users.models import Subscribe, User
+
+
+@override_settings(FEED_CELEBRITY_SUBSCRIBERS=2, BACKGROUND_EXECUTOR='sync')
+class CelebrityFeedTest(APITransactionTestCase):
+    """Рецепты, опубликованные, пока автор был знаменитостью, остаются
+    в лентах, когда подписчиков становится меньше порога."""
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.reader, self.other = (
+            User.objects.create(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'reader', 'other')
+        )
+        for user in (self.reader, self.other):
+            Subscribe.objects.create(user=user, author=self.author)
+        User.objects.filter(pk=self.author.pk).update(subscribers_count=2)
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+
+    def feed(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_recipe_stays_after_author_drops_below_threshold(self):
+        self.assertEqual(self.feed(self.reader), [self.recipe.pk])
+        client = APIClient()
+        client.force_authenticate(self.other)
+        response = client.delete(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.feed(self.reader), [self.recipe.pk])
+
+    def test_recount_backfills_former_celebrities(self):
+        Subscribe.objects.filter(user=self.other).delete()
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.feed(self.reader), [self.recipe.pk])
+
+
+class FollowAfterUnsubscribeTest(APITransactionTestCase):
+    """Отложенный follow не возвращает в ленту рецепты автора,
+    от которого пользователь успел отписаться."""
+
+    def setUp(self):
+        self.author, self.reader = (
+            User.objects.create(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name=name, last_name=name
+            )
+            for name in ('author', 'reader')
+        )
+        Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+
+    def test_follow_skips_removed_subscription(self):
+        follow(self.reader.pk, self.author.pk)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    def test_follow_fills_timeline(self):
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        follow(self.reader.pk, self.author.pk)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader))
@@ -0,0 +1,25 @@
+from unittest import skipUnless
+
+from api.benchmark import DatasetFactory, explain, scenarios
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'планы EXPLAIN проверяются на PostgreSQL')
+class IndexUsageTest(TestCase):
+    """Запросы сценариев бенчмарка читают избранное, корзины и подписки
+    по индексам, а не полным просмотром (api.benchmark.sequential_scans)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = DatasetFactory(users=10, recipes=50).seed()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_benchmark_queries_use_indexes(self):
+        for name, client, url in scenarios(self.user):
+            with self.subTest(name):
+                self.assertEqual(explain(client, url), [])
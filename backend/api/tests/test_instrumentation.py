@@ -0,0 +1,49 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.test import modify_settings, override_settings
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.test import APITestCase
+
+SERIALIZERS = (Serializer, ListSerializer)
+
+
+def is_timed(serializer_class):
+    return getattr(serializer_class.__dict__['data'].fget, 'timed', False)
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+@modify_settings(MIDDLEWARE={
+    'prepend': 'foodgram.middleware.InstrumentationMiddleware'
+})
+class ServerTimingTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_serialization_reported_separately(self):
+        response = self.client.get('/api/tags/')
+        names = [metric.strip().split(';')[0]
+                 for metric in response['Server-Timing'].split(',')]
+        self.assertEqual(names, ['db', 'serialize', 'view', 'render', 'total'])
+
+
+class InstrumentSerializersTest(APITestCase):
+    """DRF оборачивается при запуске и только с включенным сбором."""
+
+    def test_middleware_does_not_patch(self):
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=1):
+            with modify_settings(MIDDLEWARE={
+                'prepend': 'foodgram.middleware.InstrumentationMiddleware'
+            }):
+                self.client.get('/api/tags/')
+        self.assertFalse(any(map(is_timed, SERIALIZERS)))
+
+    def test_ready_patches_when_enabled(self):
+        original = {cls: cls.__dict__['data'] for cls in SERIALIZERS}
+        try:
+            with override_settings(INSTRUMENTATION_SAMPLE_RATE=1):
+                apps.get_app_config('api').ready()
+            self.assertTrue(all(map(is_timed, SERIALIZERS)))
+        finally:
+            for serializer_class, data in original.items():
+                serializer_class.data = data
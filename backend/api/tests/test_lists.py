@@ -0,0 +1,51 @@
+from unittest import mock
+
+from recipes.models import Favorite, Recipe
+from rest_framework.test import APITestCase
+from users.models import User
+
+
+class FavoriteCountersTest(APITestCase):
+    """Счетчик избранного сдвигается только на действительно
+    добавленные строки, повторное добавление — 400, а не 500."""
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+        self.client.force_authenticate(self.user)
+
+    def favorites_count(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count
+
+    def test_repeated_batch_counts_once(self):
+        for _ in range(2):
+            response = self.client.post(
+                '/api/recipes/favorite/', {'recipes': [self.recipe.pk]},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.favorites_count(), 1)
+
+    def test_concurrent_duplicate_is_bad_request(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        # Проверка наличия прошла до вставки параллельного запроса.
+        with mock.patch('django.db.models.query.QuerySet.exists',
+                        return_value=False):
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.pk}/favorite/'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.favorites_count(), 0)
+
+    def test_delete_missing_is_bad_request(self):
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 400)
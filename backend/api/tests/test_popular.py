@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.utils import timezone
+from recipes.models import Favorite, Recipe, RecipeRank
+from recipes.ranking import EVENT_SETTLE, refresh_ranking
+from rest_framework.test import APITestCase
+from users.models import User
+
+
+class PopularImageTest(APITestCase):
+    """Популярные рецепты отдают картинки абсолютными ссылками, как
+    остальные эндпоинты, хотя ответ берется из общего кеша."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+        Favorite.objects.create(user=author, recipe=recipe)
+        refresh_ranking()
+        refresh_ranking(timezone.now() + EVENT_SETTLE)
+
+    def test_popular_image_matches_list(self):
+        listed = self.client.get('/api/recipes/').data['results'][0]
+        for host in ('testserver', 'foodgram.ru'):
+            with self.subTest(host):
+                popular = self.client.get(
+                    '/api/recipes/popular/', HTTP_HOST=host
+                ).data
+                self.assertEqual(len(popular), 1)
+                self.assertEqual(
+                    popular[0]['image'],
+                    listed['image'].replace('testserver', host)
+                )
+
+
+class RankingEventsTest(APITestCase):
+    """Строка с меньшим id, закоммиченная после запуска, который уже
+    видел большие id, все равно попадает в рейтинг."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create(
+                email=f'user{number}@foodgram.ru', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(2)
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.users[0], name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+
+    def test_late_commit_with_lower_id(self):
+        now = timezone.now()
+        Favorite.objects.create(id=5, user=self.users[0], recipe=self.recipe)
+        refresh_ranking(now)
+        Favorite.objects.create(id=3, user=self.users[1], recipe=self.recipe)
+        refresh_ranking(now + EVENT_SETTLE)
+        self.assertAlmostEqual(
+            RecipeRank.objects.get(recipe=self.recipe).score, 2, places=2
+        )
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users.models import User
+
+INGREDIENTS_PER_RECIPE = 10
+
+
+class RecipeQueriesTest(APITestCase):
+    """Число запросов list и retrieve не зависит от числа рецептов
+    и ингредиентов: автор, теги и ингредиенты берутся по плану
+    RECIPE_PREFETCH."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        cls.user = User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Читатель', last_name='Рецептов'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}')
+            for i in range(3)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(INGREDIENTS_PER_RECIPE)
+        )
+        cls.tags = list(Tag.objects.all())
+        cls.ingredients = list(Ingredient.objects.all())
+
+    def setUp(self):
+        cache.clear()
+
+    def create_recipe(self, ingredients):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+        recipe.tags.set(self.tags)
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def create_recipes(self, count):
+        return [self.create_recipe(self.ingredients) for _ in range(count)]
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # Первый запрос кладет токен в кеш аутентификации.
+        self.client.get('/api/tags/')
+
+    def assert_list_queries(self, count, recipes):
+        self.create_recipes(recipes)
+        with self.assertNumQueries(count):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), recipes)
+        for recipe in response.data['results']:
+            self.assertEqual(len(recipe['tags']), len(self.tags))
+            self.assertEqual(
+                len(recipe['ingredients']), INGREDIENTS_PER_RECIPE
+            )
+
+    def test_list_one_recipe(self):
+        self.assert_list_queries(4, recipes=1)
+
+    def test_list_page_of_recipes(self):
+        self.assert_list_queries(4, recipes=6)
+
+    def test_list_authenticated(self):
+        self.authenticate()
+        self.assert_list_queries(4, recipes=6)
+
+    def assert_retrieve_queries(self, count, ingredients):
+        recipe = self.create_recipe(self.ingredients[:ingredients])
+        with self.assertNumQueries(count):
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), ingredients)
+
+    def test_retrieve_one_ingredient(self):
+        self.assert_retrieve_queries(4, ingredients=1)
+
+    def test_retrieve_many_ingredients(self):
+        self.assert_retrieve_queries(4, ingredients=INGREDIENTS_PER_RECIPE)
+
+    def test_retrieve_authenticated(self):
+        self.authenticate()
+        self.assert_retrieve_queries(4, ingredients=INGREDIENTS_PER_RECIPE)
@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from PIL import Image
+from recipes.images import build_renditions
+from recipes.models import Recipe
+from rest_framework.test import APITestCase
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RenditionsConditionalGetTest(APITestCase):
+    """Готовые уменьшенные копии меняют ссылку на картинку в ответе,
+    поэтому ETag рецепта тоже должен смениться."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        buffer = BytesIO()
+        Image.new('RGB', (32, 32), 'red').save(buffer, 'PNG')
+        name = default_storage.save(
+            'recipes/image/test.png', ContentFile(buffer.getvalue())
+        )
+        author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image=name
+        )
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_renditions_change_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertNotIn('-full.', response.data['image'])
+
+        build_renditions(self.recipe.pk, self.recipe.image.name)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('-full.', response.data['image'])
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import override_settings
+from foodgram.routers import state
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITransactionTestCase
+from users.models import User
+
+REPLICA = 'replica0'
+DIRECTORY = tempfile.mkdtemp()
+REPLICA_SETTINGS = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(DIRECTORY, 'replica.sqlite3'),
+    'TEST': {'NAME': os.path.join(DIRECTORY, 'replica.sqlite3')},
+}
+PIN_SECONDS = 0.5
+
+
+@override_settings(
+    DATABASES={**settings.DATABASES, REPLICA: REPLICA_SETTINGS},
+    DATABASE_ROUTERS=['foodgram.routers.ReplicaRouter'],
+    MIDDLEWARE=[*settings.MIDDLEWARE, 'foodgram.middleware.ReplicaMiddleware'],
+    DB_REPLICA_PIN_SECONDS=PIN_SECONDS,
+)
+class ReplicaRoutingTest(APITransactionTestCase):
+    """Реплика — отдельный файл SQLite без репликации: рецепт,
+    записанный в основную базу, виден только при чтении с нее."""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            **connections.databases['default'], **REPLICA_SETTINGS
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        if hasattr(connections._connections, REPLICA):
+            delattr(connections._connections, REPLICA)
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def listed(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_get_reads_replica(self):
+        self.assertEqual(self.listed(), [])
+
+    def test_write_pins_credentials_to_primary(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.listed(), [self.recipe.pk])
+        time.sleep(PIN_SECONDS)
+        self.assertEqual(self.listed(), [])
+
+    def test_atomic_reads_primary(self):
+        state.replica = REPLICA
+        try:
+            self.assertFalse(Recipe.objects.exists())
+            with transaction.atomic():
+                self.assertTrue(Recipe.objects.exists())
+        finally:
+            state.replica = None
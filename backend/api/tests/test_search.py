@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from recipes.models import Recipe
+from rest_framework.test import APITestCase
+from users.models import User
+
+URL = '/api/recipes/'
+
+
+class SearchPaginationTest(APITestCase):
+    """Поиск отдает рецепты по релевантности и с параметром cursor."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        self.by_name, self.by_text = (
+            Recipe.objects.create(
+                author=author, name=name, text=text,
+                cooking_time=10, image='recipes/image/test.png'
+            )
+            for name, text in (('Суп', 'Описание'), ('Каша', 'Не суп'))
+        )
+
+    def ids(self, params):
+        response = self.client.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_cursor_keeps_rank_order(self):
+        ranked = [self.by_name.pk, self.by_text.pk]
+        self.assertEqual(self.ids({'search': 'суп'}), ranked)
+        self.assertEqual(self.ids({'search': 'суп', 'cursor': ''}), ranked)
+
+    def test_cursor_without_search(self):
+        self.assertEqual(
+            self.ids({'cursor': ''}), [self.by_text.pk, self.by_name.pk]
+        )
@@ -0,0 +1,63 @@
+import json
+
+from django.core.cache import cache
+from recipes.models import AmountIngredient, Ingredient, Recipe, ShoppingCart
+from rest_framework.test import APITestCase
+from users.models import User
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListCacheTest(APITestCase):
+    """Закешированный список покупок сбрасывается при правке
+    справочника ингредиентов, а не только корзины."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/image/test.png'
+        )
+        AmountIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredient, amount=200
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(URL, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_ingredient_rename(self):
+        self.assertEqual(self.download()[0]['name'], 'Мука')
+        self.ingredient.name = 'Мука пшеничная'
+        self.ingredient.save()
+        self.assertEqual(self.download()[0]['name'], 'Мука пшеничная')
+
+
+class ShoppingListErrorsTest(APITestCase):
+    """Ошибки выгрузки приходят в JSON с Content-Type JSON."""
+
+    def test_anonymous(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', json.loads(response.content))
+
+    def test_unknown_format(self):
+        self.client.force_authenticate(User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия'
+        ))
+        response = self.client.get(URL, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', json.loads(response.content))
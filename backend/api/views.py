@@ -1,25 +1,74 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.conf import settings as djoser_settings
+from djoser.utils import logout_user
 from djoser.views import UserViewSet
+from recipes.autocomplete import AUTOCOMPLETE_LIMIT, ingredient_index
+from recipes.cache import (AUTHOR_VERSION, INGREDIENTS_VERSION, TAGS_VERSION,
+                           bump_shopping_cart_version, get_modified,
+                           get_shopping_list, get_version)
+from recipes.feed import (schedule_backfill, schedule_fan_out, schedule_follow,
+                          unfollow)
 from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
                             ShoppingCart, Tag)
+from recipes.pantry import pantry_index
+from recipes.ranking import get_popular
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from users.models import Subscribe, User
 
 from .filters import IngredientFilter, RecipeFilter
+from .pagination import FeedPagination, LimitPagination, RecipePagination
 from .permissions import IsAuthorAdminOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
 from .serializers import (BaseUserSerializer, FavoriteSerializer,
                           IngredientSerializer, PasswordSerializer,
-                          RecipeCreateSerializer, RecipeListSerializer,
+                          RecipeCreateSerializer, RecipeIdsSerializer,
+                          RecipeListSerializer, RecipeMatchSerializer,
                           ShoppingCartSerializer, SubscribeSerializer,
                           TagSerializer)
 
+POPULAR_LIMIT = 50
+
+RECIPE_PREFETCH = (
+    Prefetch('tags', queryset=Tag.objects.all()),
+    Prefetch(
+        'amount_ingredient',
+        queryset=AmountIngredient.objects.select_related('ingredient')
+    ),
+)
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на list и retrieve без сериализации,
+    если ETag или Last-Modified у клиента актуальны."""
+
+    def get_etag(self, request, *args, **kwargs):
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def conditional(self, handler):
+        return condition(
+            etag_func=self.get_etag,
+            last_modified_func=self.get_last_modified
+        )(handler)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list)(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve)(request, *args, **kwargs)
+
 
 class ListRetrieveViewSet(
     mixins.ListModelMixin,
@@ -33,6 +82,21 @@ class SubscribePasswordUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = BaseUserSerializer
 
+    def get_subscribe_queryset(self, queryset):
+        """Авторы с первыми recipes_limit рецептами."""
+        recipes = Recipe.objects.all()
+        limit = self.request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(limit)]
+            ))
+        return queryset.annotate(
+            is_subscribed=Exists(Subscribe.objects.filter(
+                user=self.request.user, author=OuterRef('pk'))),
+        ).prefetch_related(Prefetch('recipes', queryset=recipes))
+
     @action(methods=['POST'],
             detail=False,
             permission_classes=(IsAuthenticated,))
@@ -45,6 +109,9 @@ class SubscribePasswordUserViewSet(UserViewSet):
         serialier.is_valid(raise_exception=True)
         user.set_password(serialier.validated_data['new_password'])
         user.save()
+        if djoser_settings.LOGOUT_ON_PASSWORD_CHANGE:
+            # Удаление токена сбрасывает и его снимок в token_cache.
+            logout_user(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['GET'],
@@ -52,7 +119,9 @@ class SubscribePasswordUserViewSet(UserViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = self.get_subscribe_queryset(
+            User.objects.filter(following__user=user)
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             pages,
@@ -74,9 +143,16 @@ class SubscribePasswordUserViewSet(UserViewSet):
                     'errors': 'Нельзя подписаться на самого себя'
                 }
                 return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-            Subscribe.objects.create(user=user, author=author)
+            with transaction.atomic():
+                Subscribe.objects.create(user=user, author=author)
+                User.objects.filter(pk=author.pk).update(
+                    subscribers_count=F('subscribers_count') + 1
+                )
+                schedule_follow(user, author)
             serializer = SubscribeSerializer(
-                author,
+                self.get_subscribe_queryset(
+                    User.objects.filter(id=author.id)
+                ).get(),
                 context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -84,18 +160,30 @@ class SubscribePasswordUserViewSet(UserViewSet):
             if not subscribe.exists():
                 data = {'errors': 'Вы не подписаны на пользователя'}
                 return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-            subscribe.delete()
+            with transaction.atomic():
+                deleted, _ = subscribe.delete()
+                User.objects.filter(pk=author.pk).update(subscribers_count=(
+                    Greatest(F('subscribers_count') - deleted, 0)
+                ))
+                unfollow(user.pk, author.pk)
+                schedule_backfill(
+                    author, author.subscribers_count,
+                    author.subscribers_count - deleted
+                )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(ConditionalGetMixin, ListRetrieveViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def get_etag(self, request, *args, **kwargs):
+        return f'tags-{get_version(TAGS_VERSION)}'
 
-class IngredientViewSet(ListRetrieveViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, ListRetrieveViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
@@ -103,47 +191,223 @@ class IngredientViewSet(ListRetrieveViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def get_etag(self, request, *args, **kwargs):
+        return f'ingredients-{get_version(INGREDIENTS_VERSION)}'
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        name = request.query_params.get('name', '')
+        limit = request.query_params.get('limit', '')
+        limit = (min(int(limit), AUTOCOMPLETE_LIMIT) if limit.isdigit()
+                 else AUTOCOMPLETE_LIMIT)
+        return Response(ingredient_index.search(name, limit))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeListSerializer
     permission_classes = (IsAuthorAdminOrReadOnly, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
+    list_counters = {
+        Favorite: 'favorites_count',
+        ShoppingCart: 'shopping_cart_count',
+    }
+
+    def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            *RECIPE_PREFETCH
+        ).with_user_flags(self.request.user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['image_rendition'] = 'full'
+        return context
+
+    def get_recipe_state(self, request, pk=None):
+        """Дата изменения, автор и флаги пользователя одним легким
+        запросом."""
+        if self.action != 'retrieve':
+            return None
+        if not hasattr(self, '_recipe_state'):
+            self._recipe_state = Recipe.objects.with_user_flags(
+                request.user
+            ).filter(pk=pk).values_list(
+                'updated_at',
+                'author_id',
+                'is_favorited',
+                'is_in_shopping_cart',
+                'is_author_subscribed'
+            ).first()
+        return self._recipe_state
+
+    @staticmethod
+    def related_versions(author_id):
+        """Версии данных, которые рецепт показывает, но которые не
+        двигают его updated_at: теги, ингредиенты и профиль автора."""
+        return (TAGS_VERSION, INGREDIENTS_VERSION,
+                AUTHOR_VERSION.format(author_id))
+
+    def get_etag(self, request, pk=None):
+        state = self.get_recipe_state(request, pk)
+        if state is None:
+            return None
+        updated_at, author_id, *flags = state
+        versions = '-'.join(
+            str(get_version(name))
+            for name in self.related_versions(author_id)
+        )
+        flags = ''.join(str(int(flag)) for flag in flags)
+        return f'recipe-{pk}-{updated_at.timestamp()}-{versions}-{flags}'
+
+    def get_last_modified(self, request, pk=None):
+        if request.user.is_authenticated:
+            return None
+        state = self.get_recipe_state(request, pk)
+        if state is None:
+            return None
+        updated_at, author_id, *_ = state
+        return max(updated_at,
+                   *get_modified(*self.related_versions(author_id)))
+
+    @staticmethod
+    def lock_lists(user):
+        """Изменения списков одного пользователя идут по очереди: строки,
+        прочитанные после блокировки, не меняются до коммита, и счетчики
+        сдвигаются ровно на вставленные и удаленные строки."""
+        User.objects.select_for_update().filter(pk=user.pk).values_list(
+            'pk'
+        ).get()
 
     def get_list(self, request, list_model, pk=None):
         user = self.request.user
         recipe = get_object_or_404(Recipe, pk=pk)
         in_list = list_model.objects.filter(user=user, recipe=recipe)
+        counter = self.list_counters[list_model]
         if request.method == 'POST':
-            if not in_list:
-                list_objects = list_model.objects.create(user=user,
-                                                         recipe=recipe)
-                if isinstance(list_model, Favorite):
-                    serializer = FavoriteSerializer(list_objects.recipe)
-                else:
-                    serializer = ShoppingCartSerializer(
-                        list_objects.recipe
+            data = {
+                'errors': 'Рецепт уже в списке'
+            }
+            try:
+                with transaction.atomic():
+                    self.lock_lists(user)
+                    if in_list.exists():
+                        return Response(data=data,
+                                        status=status.HTTP_400_BAD_REQUEST)
+                    list_model.objects.create(user=user, recipe=recipe)
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        **{counter: F(counter) + 1}
                     )
-                return Response(data=serializer.data,
-                                status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            if not in_list:
+            except IntegrityError:
+                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+            if list_model is Favorite:
+                serializer = FavoriteSerializer(recipe)
+            else:
+                serializer = ShoppingCartSerializer(recipe)
+            return Response(data=serializer.data,
+                            status=status.HTTP_201_CREATED)
+        with transaction.atomic():
+            self.lock_lists(user)
+            deleted, _ = in_list.delete()
+            if not deleted:
                 data = {
                     'errors': 'Рецепта нет в списке'
                 }
                 return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
-            in_list.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                **{counter: Greatest(F(counter) - deleted, 0)}
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_list_batch(self, request, list_model):
+        """Добавляет или убирает сразу несколько рецептов: один запрос
+        на проверку id, одна вставка или одно удаление."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = set(serializer.validated_data['recipes'])
+        user = request.user
+        counter = self.list_counters[list_model]
+        in_list = list_model.objects.filter(user=user,
+                                            recipe_id__in=recipe_ids)
+        if request.method == 'POST':
+            recipes = Recipe.objects.in_bulk(recipe_ids)
+            not_found = recipe_ids - recipes.keys()
+            if not_found:
+                data = {
+                    'errors': 'Рецепты не найдены',
+                    'recipes': sorted(not_found),
+                }
+                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+                self.lock_lists(user)
+                added = recipe_ids - set(in_list.values_list('recipe_id',
+                                                             flat=True))
+                list_model.objects.bulk_create(
+                    (list_model(user=user, recipe_id=recipe_id)
+                     for recipe_id in added),
+                    ignore_conflicts=True
+                )
+                Recipe.objects.filter(pk__in=added).update(
+                    **{counter: F(counter) + 1}
+                )
+            if list_model is ShoppingCart and added:
+                # bulk_create не отправляет post_save
+                bump_shopping_cart_version(user.pk)
+            serializer_class = (FavoriteSerializer if list_model is Favorite
+                                else ShoppingCartSerializer)
+            return Response(
+                data=serializer_class(
+                    sorted(recipes.values(), key=lambda recipe: recipe.pk),
+                    many=True, context={'request': request}
+                ).data,
+                status=status.HTTP_201_CREATED
+            )
+        with transaction.atomic():
+            self.lock_lists(user)
+            removed = list(in_list.values_list('recipe_id', flat=True))
+            list_model.objects.filter(
+                user=user, recipe_id__in=removed
+            ).delete()
+            Recipe.objects.filter(pk__in=removed).update(
+                **{counter: Greatest(F(counter) - 1, 0)}
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Ошибки выгрузки списка покупок (401, 404 на неизвестный
+        format) отдаются в JSON с соответствующим Content-Type, а не
+        рендерером списка."""
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (self.action == 'download_shopping_cart'
+                and getattr(response, 'exception', False)):
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+        return response
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeListSerializer
         return RecipeCreateSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        schedule_fan_out(recipe)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        author_id = instance.author_id
+        instance.delete()
+        User.objects.filter(pk=author_id).update(
+            recipes_count=Greatest(F('recipes_count') - 1, 0)
+        )
 
     @action(methods=['POST', 'DELETE'],
             detail=True,
@@ -157,27 +421,108 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk=None):
         return self.get_list(request=request, list_model=ShoppingCart, pk=pk)
 
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            url_path='favorite',
+            permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        return self.get_list_batch(request=request, list_model=Favorite)
+
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            url_path='shopping_cart',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return self.get_list_batch(request=request, list_model=ShoppingCart)
+
     @action(methods=['GET'],
             detail=False,
             permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        paginator = FeedPagination(self.paginator.get_page_size(request))
+        page = paginator.paginate_queryset(self.get_queryset(), request, self)
+        serializer = RecipeListSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'],
+            detail=False,
+            permission_classes=(AllowAny,))
+    def popular(self, request):
+        tag = request.query_params.get('tags')
+        limit = request.query_params.get('limit', '')
+        limit = (min(int(limit), POPULAR_LIMIT) if limit.isdigit()
+                 else self.paginator.get_page_size(request))
+        popular = get_popular(
+            tag, limit,
+            lambda recipes: FavoriteSerializer(recipes, many=True).data
+        )
+        # В кеше ссылки на картинки относительные, общие для всех хостов;
+        # как и в остальных ответах, клиент получает абсолютные.
+        return Response([
+            {**recipe,
+             'image': recipe['image'] and request.build_absolute_uri(
+                 recipe['image']
+             )}
+            for recipe in popular
+        ])
+
+    @action(methods=['GET'],
+            detail=False,
+            permission_classes=(AllowAny,))
+    def match(self, request):
+        have = request.query_params.get('have', '')
+        try:
+            pantry = {int(pk) for pk in have.split(',') if pk.strip()}
+        except ValueError:
+            pantry = None
+        if not pantry:
+            data = {
+                'errors': 'Укажите id ингредиентов через запятую'
+            }
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        paginator = LimitPagination()
+        page = paginator.paginate_queryset(
+            pantry_index.match(pantry), request, view=self
+        )
+        missing = pantry_index.missing(
+            [recipe_id for recipe_id, *_ in page], pantry
+        )
+        recipes = Recipe.objects.in_bulk(missing)
+        ingredients = Ingredient.objects.in_bulk(
+            set().union(*missing.values())
+        )
+        results = []
+        for recipe_id, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(matched / total, 2)
+            recipe.missing_ingredients = sorted(
+                (ingredients[pk] for pk in missing[recipe_id]
+                 if pk in ingredients),
+                key=lambda ingredient: ingredient.name
+            )
+            results.append(recipe)
+        return paginator.get_paginated_response(
+            RecipeMatchSerializer(
+                results, many=True, context={'request': request}
+            ).data
+        )
+
+    @action(methods=['GET'],
+            detail=False,
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        ingredients = AmountIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).order_by().annotate(
-            Sum('amount')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(get_shopping_list(request.user)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
         )
-        shopping_list = 'Список покупок: \n'
-        for ingredient in ingredients:
-            name, measure, amount = ingredient
-            shopping_list += f'{name}'
-            shopping_list += f'({measure})'
-            shopping_list += f' — {amount}\n'
-        response = HttpResponse(shopping_list, 'Content-Type: application/txt')
         response['Content-Disposition'] = (
             'attachment;'
-            'filename="shoppinglist.txt"'
+            f'filename="shoppinglist.{renderer.format}"'
         )
         return response
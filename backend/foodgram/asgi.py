@@ -0,0 +1,7 @@
+import os
+
+from foodgram.handlers import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+application = get_asgi_application()
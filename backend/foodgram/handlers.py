@@ -0,0 +1,180 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Event
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+SPECIAL_HEADERS = ('CONTENT_TYPE', 'CONTENT_LENGTH')
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_QUEUE_SIZE = 16
+
+
+def wsgi_path(path):
+    """Путь ASGI (str) в виде, который ждет WSGI: байты UTF-8 как latin-1."""
+    return path.encode('utf-8').decode('latin-1')
+
+
+def header_environ(headers):
+    environ = {}
+    for name, value in headers:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in SPECIAL_HEADERS else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class ASGIHandler:
+    """ASGI-вход для Django 2.2, в котором нет ни своего ASGI-обработчика,
+    ни async-представлений. Запрос целиком — middleware, view, ORM,
+    рендеринг и потоковый ответ — выполняется в пуле из ASGI_THREADS
+    потоков, а чтение тела запроса и отправка ответа идут в цикле
+    событий. Поток передает ответ кусками через очередь из
+    STREAM_QUEUE_SIZE элементов: обычный ответ целиком помещается в нее,
+    и поток сразу свободен, а потоковый (список покупок) отдается по
+    мере чтения клиентом без накопления в памяти."""
+
+    def __init__(self, workers=None):
+        self.wsgi = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or settings.ASGI_THREADS
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stop = Event()
+
+        def put(item):
+            """Из потока пула: ждет места в очереди; False — клиент ушел."""
+            if stop.is_set():
+                return False
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            return not stop.is_set()
+
+        worker = loop.run_in_executor(
+            self.executor, self.respond, self.environ(scope, body), put
+        )
+        try:
+            await self.stream(scope, send, queue)
+        finally:
+            stop.set()
+            while not queue.empty():
+                queue.get_nowait()
+        await worker
+
+    @staticmethod
+    async def stream(scope, send, queue):
+        start = await queue.get()
+        if start is None:
+            return
+        status, headers = start
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            if scope['method'] != 'HEAD':
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        """Тело запроса целиком или None, если клиент ушел."""
+        body = BytesIO()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                return body.getvalue()
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        return {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': wsgi_path(scope.get('root_path', '')),
+            'PATH_INFO': wsgi_path(scope['path']),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1] or 80),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            **header_environ(scope.get('headers', ())),
+        }
+
+    def respond(self, environ, put):
+        """Выполняется в потоке пула: отдает в put статус с заголовками,
+        затем тело кусками до STREAM_CHUNK_SIZE и None в конце. Закрытие
+        ответа (request_finished) происходит в том же потоке, что и
+        запросы к базе, поэтому соединения потока переиспользуются по
+        CONN_MAX_AGE."""
+
+        def start_response(status, headers, exc_info=None):
+            put((int(status.split(' ', 1)[0]), [
+                (name.encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]))
+
+        try:
+            response = self.wsgi(environ, start_response)
+            try:
+                buffer = BytesIO()
+                for chunk in response:
+                    buffer.write(chunk)
+                    if buffer.tell() < STREAM_CHUNK_SIZE:
+                        continue
+                    if not put(buffer.getvalue()):
+                        return
+                    buffer = BytesIO()
+                if buffer.tell():
+                    put(buffer.getvalue())
+            finally:
+                response.close()
+        finally:
+            put(None)
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
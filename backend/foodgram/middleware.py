@@ -0,0 +1,223 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from hashlib import sha256
+from threading import local
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.serializers import ListSerializer, Serializer
+
+from .routers import replica_pool, state
+
+logger = logging.getLogger('foodgram.instrumentation')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SPACES = re.compile(r'\s+')
+
+recording = local()
+
+
+def fingerprint(sql):
+    """SQL без литералов и длины IN-списков, чтобы сравнивать запросы."""
+    sql = LITERALS.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """execute_wrapper: считает запросы, их время и отпечатки,
+    а также время сериализации DRF без запросов внутри нее."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.serialize = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold):
+        return {
+            sql: count for sql, count in self.fingerprints.items()
+            if count >= threshold
+        }
+
+
+def timed_data(data):
+    """Свойство data сериализатора, которое добавляет время самой
+    внешней сериализации к записи текущего запроса."""
+
+    def wrapper(serializer):
+        recorder = getattr(recording, 'recorder', None)
+        if recorder is None or recorder.serializing:
+            return data.fget(serializer)
+        recorder.serializing = True
+        started = time.perf_counter()
+        db_started = recorder.duration
+        try:
+            return data.fget(serializer)
+        finally:
+            recorder.serializing = False
+            recorder.serialize += (time.perf_counter() - started
+                                   - (recorder.duration - db_started))
+
+    wrapper.timed = True
+    return property(wrapper)
+
+
+def instrument_serializers():
+    """Оборачивает Serializer.data и ListSerializer.data для всего
+    процесса. Вызывается один раз при запуске (ApiConfig.ready),
+    если INSTRUMENTATION_SAMPLE_RATE > 0."""
+    for serializer_class in (Serializer, ListSerializer):
+        data = serializer_class.__dict__['data']
+        if not getattr(data.fget, 'timed', False):
+            serializer_class.data = timed_data(data)
+
+
+class InstrumentationMiddleware:
+    """Для доли запросов INSTRUMENTATION_SAMPLE_RATE пишет в заголовок
+    Server-Timing и в лог число SQL-запросов, время БД, сериализации
+    DRF, остального кода view и рендеринга ответа, а также повторяющиеся
+    запросы (N+1). Время сериализации считается, если при запуске
+    вызван instrument_serializers."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.INSTRUMENTATION_SAMPLE_RATE
+        self.threshold = settings.INSTRUMENTATION_DUPLICATE_THRESHOLD
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        request._instrumentation = {}
+        started = time.perf_counter()
+        recording.recorder = recorder
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            recording.recorder = None
+        total = time.perf_counter() - started
+        self.report(request, response, recorder, total)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, '_instrumentation', None)
+        if timings is None:
+            return response
+        render_started = time.perf_counter()
+
+        def rendered(response):
+            timings['render'] = time.perf_counter() - render_started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, recorder, total):
+        render = request._instrumentation.get('render', 0.0)
+        serialize = recorder.serialize
+        view = max(total - recorder.duration - serialize - render, 0.0)
+        duplicates = recorder.duplicates(self.threshold)
+        metrics = [
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries"',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'view;dur={view * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if duplicates:
+            metrics.append(
+                f'dup;desc="{sum(duplicates.values())} repeated queries"'
+            )
+        response['Server-Timing'] = ', '.join(metrics)
+        match = request.resolver_match
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'serialize_ms': round(serialize * 1000, 2),
+            'view_ms': round(view * 1000, 2),
+            'render_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        if duplicates:
+            record['duplicates'] = duplicates
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaMiddleware:
+    """Безопасные запросы читают с реплики. После успешной записи
+    клиент DB_REPLICA_PIN_SECONDS секунд читает с основной базы,
+    чтобы видеть свои изменения, пока реплика догоняет."""
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def pin_key(request):
+        credentials = (request.META.get('HTTP_AUTHORIZATION')
+                       or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        if not credentials:
+            return None
+        return f'db_pin:{sha256(credentials.encode()).hexdigest()}'
+
+    def __call__(self, request):
+        key = self.pin_key(request)
+        safe = request.method in self.safe_methods
+        alias = None
+        if safe and not (key and cache.get(key)):
+            alias = replica_pool.acquire()
+        state.replica = alias
+        try:
+            response = self.get_response(request)
+        finally:
+            state.replica = None
+            if alias is not None:
+                replica_pool.release(alias)
+        if not safe and key and response.status_code < 400:
+            cache.set(key, True, settings.DB_REPLICA_PIN_SECONDS)
+        return response
+
+
+class ConnectionHealthMiddleware:
+    """Перед запросом проверяет постоянные соединения (CONN_MAX_AGE),
+    оставшиеся от прошлых запросов: соединение, оборванное базой или
+    прокси за время простоя, закрывается, и запрос откроет новое
+    вместо того, чтобы упасть на первом SQL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for connection in connections.all():
+            if (connection.connection is not None
+                    and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                    and not connection.is_usable()):
+                connection.close()
+        return self.get_response(request)
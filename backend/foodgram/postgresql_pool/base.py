@@ -0,0 +1,60 @@
+from threading import Lock
+
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+_pools = {}
+_pools_lock = Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений процесса (psycopg2.pool).
+
+    Закрытие соединения в Django возвращает его в пул, поэтому
+    CONN_MAX_AGE для этой базы равен 0: соединение отдается после
+    каждого запроса и достается следующему без нового handshake.
+    settings_dict['POOL']: max_size — предел открытых соединений
+    (больше — PoolError), min_size — сколько свободных соединений
+    пул держит открытыми, лишние закрываются при возврате."""
+
+    def get_pool(self):
+        with _pools_lock:
+            if self.alias not in _pools:
+                options = self.settings_dict['POOL']
+                _pools[self.alias] = pool.ThreadedConnectionPool(
+                    options['min_size'], options['max_size'],
+                    **self.get_connection_params()
+                )
+            return _pools[self.alias]
+
+    def checkout(self):
+        """Соединение из пула; при CONN_HEALTH_CHECKS оборванное
+        простаивавшее соединение заменяется новым."""
+        connection = self.get_pool().getconn()
+        if not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return connection
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except base.Database.Error:
+            self.get_pool().putconn(connection, close=True)
+            connection = self.get_pool().getconn()
+        return connection
+
+    def get_new_connection(self, conn_params):
+        connection = self.checkout()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool().putconn(self.connection)
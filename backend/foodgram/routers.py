@@ -0,0 +1,103 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from threading import Lock, local
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM '
+    'now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+state = local()
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут на основную базу."""
+    replica = getattr(state, 'replica', None)
+    state.replica = None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+class ReplicaPool:
+    """Выбор реплики для запроса: по кругу или наименее загруженная
+    (меньше всего запросов этого процесса сейчас читают с нее).
+    Реплики с отставанием больше DB_REPLICA_MAX_LAG пропускаются."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._turn = 0
+        self._active = Counter()
+        self._lag = {}
+
+    @staticmethod
+    def aliases():
+        return [alias for alias in settings.DATABASES
+                if alias != DEFAULT_DB_ALIAS]
+
+    def lag(self, alias):
+        checked_at, lag = self._lag.get(alias, (None, 0.0))
+        now = time.monotonic()
+        if (checked_at is not None
+                and now - checked_at < settings.DB_REPLICA_LAG_CHECK):
+            return lag
+        connection = connections[alias]
+        lag = 0.0
+        if connection.vendor == 'postgresql':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(LAG_SQL)
+                    lag = float(cursor.fetchone()[0])
+            except DatabaseError:
+                lag = float('inf')
+        self._lag[alias] = (now, lag)
+        return lag
+
+    def acquire(self):
+        healthy = [alias for alias in self.aliases()
+                   if self.lag(alias) <= settings.DB_REPLICA_MAX_LAG]
+        if not healthy:
+            return None
+        with self._lock:
+            if settings.DB_REPLICA_SELECTION == 'least_loaded':
+                alias = min(healthy, key=lambda alias: self._active[alias])
+            else:
+                alias = healthy[self._turn % len(healthy)]
+                self._turn += 1
+            self._active[alias] += 1
+        return alias
+
+    def release(self, alias):
+        with self._lock:
+            self._active[alias] -= 1
+
+
+replica_pool = ReplicaPool()
+
+
+class ReplicaRouter:
+    """Чтения запроса, которому ReplicaMiddleware выдал реплику, идут
+    на нее; все остальное, включая чтения внутри транзакции, —
+    на основную базу."""
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(state, 'replica', None)
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
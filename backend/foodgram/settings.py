@@ -1,5 +1,6 @@
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -38,6 +39,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', default='0'))
+INSTRUMENTATION_DUPLICATE_THRESHOLD = int(os.getenv('INSTRUMENTATION_DUPLICATE_THRESHOLD', default='3'))
+
+if INSTRUMENTATION_SAMPLE_RATE > 0:
+    MIDDLEWARE.insert(0, 'foodgram.middleware.InstrumentationMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -58,6 +65,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', default='10'))
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
@@ -65,14 +74,62 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='1111'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')}
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default='60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', default='true').lower() == 'true'}
+}
+
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', default='2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', default='0'))
+
+if DB_POOL_MAX_SIZE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default'].update(
+        ENGINE='foodgram.postgresql_pool',
+        CONN_MAX_AGE=0,
+        POOL={'min_size': min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE), 'max_size': DB_POOL_MAX_SIZE},
+    )
+
+if DATABASES['default']['CONN_MAX_AGE'] and DATABASES['default']['CONN_HEALTH_CHECKS']:
+    MIDDLEWARE.insert(0, 'foodgram.middleware.ConnectionHealthMiddleware')
+
+DB_REPLICAS = [name for name in os.getenv('DB_REPLICAS', default='').split(',') if name]
+DB_REPLICA_SELECTION = os.getenv('DB_REPLICA_SELECTION', default='round_robin')
+DB_REPLICA_PIN_SECONDS = float(os.getenv('DB_REPLICA_PIN_SECONDS', default='5'))
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', default='5'))
+DB_REPLICA_LAG_CHECK = float(os.getenv('DB_REPLICA_LAG_CHECK', default='5'))
+
+for index, replica in enumerate(DB_REPLICAS):
+    location = 'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        location: replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+if DB_REPLICAS:
+    DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+    MIDDLEWARE.append('foodgram.middleware.ReplicaMiddleware')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
 }
 
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', default='1'))
+
+if not DEBUG and WEB_CONCURRENCY > 1 and CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    raise ImproperlyConfigured(
+        'Версии корзины, ETag, индексов и токенов хранятся в кеше: '
+        'для нескольких воркеров задайте общий CACHE_BACKEND (Redis)'
+    )
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES':
-    ['rest_framework.authentication.TokenAuthentication', ],
+    ['api.authentication.CachedTokenAuthentication', ],
 
     'DEFAULT_PERMISSION_CLASSES':
     ['rest_framework.permissions.AllowAny', ],
@@ -83,9 +140,14 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default='1024'))
+AUTH_TOKEN_LOCAL_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_TTL', default='10'))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default='300'))
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
+    'LOGOUT_ON_PASSWORD_CHANGE': True,
     'SERIALIZERS': {
         'user': 'api.serializers.BaseUserSerializer',
         'user_create': 'api.serializers.BaseUserCreateSerializer',
@@ -111,6 +173,27 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'foodgram.background': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+
 LANGUAGE_CODE = 'ru-RU'
 
 TIME_ZONE = 'Europe/Moscow'
@@ -128,4 +211,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+BACKGROUND_EXECUTOR = os.getenv('BACKGROUND_EXECUTOR', default='thread')
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default='2'))
+
+FEED_CELEBRITY_SUBSCRIBERS = int(os.getenv('FEED_CELEBRITY_SUBSCRIBERS', default='1000'))
+
+IMAGE_RENDER_PROCESSES = int(os.getenv('IMAGE_RENDER_PROCESSES', default='0'))
+IMAGE_RENDITION_FORMAT = os.getenv('IMAGE_RENDITION_FORMAT', default='WEBP')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
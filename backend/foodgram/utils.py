@@ -0,0 +1,17 @@
+from itertools import islice
+
+
+def batched(rows, size):
+    """Разбивает итерируемое на списки не длиннее size."""
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+class EchoBuffer:
+    """Файлоподобный объект для csv.writer, возвращает строку как есть."""
+
+    def write(self, value):
+        return value
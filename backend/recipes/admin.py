@@ -40,7 +40,7 @@ class RecipeAdmin(ModelAdmin):
     empty_value_display = '-пусто-'
 
     def favorited(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     favorited.short_description = 'В избранном'
 
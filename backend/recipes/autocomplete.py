@@ -0,0 +1,67 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+from recipes.cache import INGREDIENTS_VERSION, VersionedIndex
+from recipes.models import Ingredient
+
+AUTOCOMPLETE_LIMIT = 20
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class IngredientIndex(VersionedIndex):
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Названия приводятся через casefold и сортируются, поиск по префиксу
+    идет бинарным поиском, по подстроке — через пересечение триграмм.
+    Индекс перестраивается, когда меняется версия таблицы в кеше.
+    """
+    version_name = INGREDIENTS_VERSION
+
+    def __init__(self):
+        super().__init__(((), (), {}))
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['id'])
+        )
+        keys = tuple(row['name'].casefold() for row in rows)
+        postings = defaultdict(list)
+        for position, key in enumerate(keys):
+            for trigram in trigrams(key):
+                postings[trigram].append(position)
+        return keys, tuple(rows), dict(postings)
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        self.refresh()
+        keys, rows, postings = self._state
+        query = query.casefold().strip()
+        if not query or limit <= 0:
+            return []
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(rows[position])
+            position += 1
+        if len(result) == limit or len(query) < 3:
+            return result
+        candidates = sorted(
+            (postings.get(trigram, ()) for trigram in trigrams(query)),
+            key=len
+        )
+        matches = set(candidates[0]).intersection(*candidates[1:])
+        for position in sorted(matches):
+            key = keys[position]
+            if query in key and not key.startswith(query):
+                result.append(rows[position])
+                if len(result) == limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
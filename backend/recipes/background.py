@@ -0,0 +1,44 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger('foodgram.background')
+
+_executors = {}
+_executors_lock = Lock()
+
+
+def shared_executor(name, factory):
+    """Пул процесса с именем name; создается factory при первом
+    обращении."""
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = factory()
+        return _executors[name]
+
+
+def get_executor():
+    return shared_executor('threads', lambda: ThreadPoolExecutor(
+        max_workers=settings.BACKGROUND_WORKERS
+    ))
+
+
+def run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s упала', func.__name__)
+    finally:
+        connection.close()
+
+
+def on_commit(func, *args):
+    """После коммита выполняет func в пуле потоков процесса;
+    при BACKGROUND_EXECUTOR = 'sync' — сразу, в том же потоке."""
+    if settings.BACKGROUND_EXECUTOR == 'sync':
+        transaction.on_commit(lambda: func(*args))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run, func, *args))
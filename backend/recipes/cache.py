@@ -0,0 +1,112 @@
+import time
+from threading import Lock
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from foodgram.routers import use_primary
+from recipes.models import AmountIngredient
+
+VERSION_KEY = 'version:{}'
+MODIFIED_KEY = 'modified:{}'
+SHOPPING_CART_VERSION = 'shopping_cart:{}'
+SHOPPING_LIST_KEY = 'shopping_list:{}:{}:{}'
+INGREDIENTS_VERSION = 'ingredients'
+TAGS_VERSION = 'tags'
+AUTHOR_VERSION = 'author:{}'
+
+
+def get_version(name):
+    """Счетчик версии; при потере ключа начинаем с метки времени,
+    чтобы не совпасть со старыми закешированными данными."""
+    key = VERSION_KEY.format(name)
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def bump_version(*names):
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_modified(*names):
+    """Время последнего bump_modified для каждого имени; при потере
+    ключа — текущее, чтобы Last-Modified не оказался слишком старым."""
+    keys = [MODIFIED_KEY.format(name) for name in names]
+    modified = cache.get_many(keys)
+    now = timezone.now()
+    for key in keys:
+        if key not in modified:
+            cache.add(key, now, timeout=None)
+            modified[key] = cache.get(key, now)
+    return [modified[key] for key in keys]
+
+
+def bump_modified(*names):
+    """bump_version и время изменения для Last-Modified."""
+    bump_version(*names)
+    cache.set_many(
+        {MODIFIED_KEY.format(name): timezone.now() for name in names},
+        timeout=None
+    )
+
+
+class VersionedIndex:
+    """Структура в памяти процесса, которая пересобирается из основной
+    базы, когда меняется версия version_name в кеше. Потомок задает
+    _build(), возвращающий новое состояние для self._state."""
+    version_name = None
+
+    def __init__(self, state=None):
+        self._lock = Lock()
+        self._version = None
+        self._state = state
+
+    def _build(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        version = get_version(self.version_name)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                with use_primary():
+                    self._state = self._build()
+                self._version = version
+
+
+def get_shopping_cart_version(user_id):
+    return get_version(SHOPPING_CART_VERSION.format(user_id))
+
+
+def bump_shopping_cart_version(*user_ids):
+    bump_version(*(SHOPPING_CART_VERSION.format(user_id)
+                   for user_id in user_ids))
+
+
+def get_shopping_list(user):
+    """Список (название, единица, количество) для корзины пользователя.
+    Ключ меняется и с корзиной, и при правке справочника ингредиентов."""
+    key = SHOPPING_LIST_KEY.format(
+        user.id, get_shopping_cart_version(user.id),
+        get_version(INGREDIENTS_VERSION)
+    )
+    shopping_list = cache.get(key)
+    if shopping_list is None:
+        with use_primary():
+            shopping_list = list(AmountIngredient.objects.filter(
+                recipe__shopping_cart__user=user
+            ).values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit'
+            ).order_by('ingredient__name').annotate(
+                Sum('amount')
+            ))
+        cache.set(key, shopping_list)
+    return shopping_list
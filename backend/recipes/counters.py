@@ -0,0 +1,26 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    """Подзапрос: число строк model, ссылающихся на текущую запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def recount(recipe_model, user_model, favorite_model, cart_model,
+            subscribe_model):
+    """Пересчитывает все счетчики по исходным таблицам."""
+    recipe_model.objects.update(
+        favorites_count=count_of(favorite_model, 'recipe'),
+        shopping_cart_count=count_of(cart_model, 'recipe'),
+    )
+    user_model.objects.update(
+        recipes_count=count_of(recipe_model, 'author'),
+        subscribers_count=count_of(subscribe_model, 'author'),
+    )
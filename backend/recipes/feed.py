@@ -0,0 +1,172 @@
+from heapq import merge
+
+from django.conf import settings
+from foodgram.utils import batched
+from recipes import background
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscribe, User
+
+FEED_BACKFILL = 50
+FANOUT_BATCH = 1000
+
+
+def is_celebrity(subscribers_count):
+    """Рецепты таких авторов не раскладываются по лентам подписчиков,
+    а подмешиваются при чтении (fan-out on read)."""
+    return subscribers_count >= settings.FEED_CELEBRITY_SUBSCRIBERS
+
+
+def fan_out(recipe_id):
+    """Кладет рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'pub_date', 'author__subscribers_count'
+    ).first()
+    if recipe is None or is_celebrity(recipe['author__subscribers_count']):
+        return 0
+    followers = Subscribe.objects.filter(
+        author_id=recipe['author_id']
+    ).values_list('user_id', flat=True)
+    added = 0
+    for batch in batched(followers.iterator(), FANOUT_BATCH):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, author_id=recipe['author_id'],
+                           recipe_id=recipe_id, pub_date=recipe['pub_date'])
+             for user_id in batch),
+            ignore_conflicts=True
+        )
+        added += len(batch)
+    return added
+
+
+def recent_recipes(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date')[:FEED_BACKFILL])
+
+
+def subscribers_of(author_id):
+    return User.objects.filter(pk=author_id).values_list(
+        'subscribers_count', flat=True
+    ).first()
+
+
+def follow(user_id, author_id):
+    """Добавляет в ленту последние рецепты нового автора.
+
+    Выполняется в фоне после коммита, а unfollow — сразу в запросе
+    на отписку, поэтому подписка к этому времени может уже исчезнуть:
+    она проверяется до вставки и еще раз после нее."""
+    subscription = Subscribe.objects.filter(
+        user_id=user_id, author_id=author_id
+    )
+    if not subscription.exists():
+        return
+    add_recent(user_id, author_id)
+    if not subscription.exists():
+        unfollow(user_id, author_id)
+
+
+def add_recent(user_id, author_id):
+    subscribers_count = subscribers_of(author_id)
+    if subscribers_count is None or is_celebrity(subscribers_count):
+        return
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, author_id=author_id,
+                       recipe_id=recipe_id, pub_date=pub_date)
+         for recipe_id, pub_date in recent_recipes(author_id)),
+        ignore_conflicts=True
+    )
+
+
+def backfill(author_id):
+    """Автор опустился ниже порога знаменитости: его рецепты больше
+    не подмешиваются при чтении, а опубликованные за это время не
+    раскладывались по лентам. Кладет последние рецепты автора в ленты
+    всех подписчиков."""
+    subscribers_count = subscribers_of(author_id)
+    if subscribers_count is None or is_celebrity(subscribers_count):
+        return 0
+    recipes = recent_recipes(author_id)
+    if not recipes:
+        return 0
+    followers = Subscribe.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    added = 0
+    for batch in batched(followers.iterator(),
+                         max(FANOUT_BATCH // len(recipes), 1)):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, author_id=author_id,
+                           recipe_id=recipe_id, pub_date=pub_date)
+             for user_id in batch for recipe_id, pub_date in recipes),
+            ignore_conflicts=True
+        )
+        added += len(batch)
+    return added
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def schedule_fan_out(recipe):
+    background.on_commit(fan_out, recipe.pk)
+
+
+def schedule_follow(user, author):
+    background.on_commit(follow, user.pk, author.pk)
+
+
+def schedule_backfill(author, subscribers_before, subscribers_after):
+    if (is_celebrity(subscribers_before)
+            and not is_celebrity(subscribers_after)):
+        background.on_commit(backfill, author.pk)
+
+
+def before(queryset, position, pk_field):
+    if position is None:
+        return queryset
+    pub_date, pk = position
+    return queryset.filter(pub_date__lte=pub_date).exclude(
+        **{'pub_date': pub_date, f'{pk_field}__gte': pk}
+    )
+
+
+def timeline_page(user, position, limit):
+    """До limit пар (pub_date, id рецепта) ленты старше position.
+
+    Основная часть — один проход по индексу ленты пользователя,
+    рецепты авторов-знаменитостей дочитываются из индекса
+    (author, pub_date) рецептов и сливаются по дате."""
+    entries = before(
+        TimelineEntry.objects.filter(user=user), position, 'recipe_id'
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]
+    celebrities = Subscribe.objects.filter(
+        user=user,
+        author__subscribers_count__gte=settings.FEED_CELEBRITY_SUBSCRIBERS
+    ).values('author_id')
+    fan_out_on_read = before(
+        Recipe.objects.filter(author__in=celebrities), position, 'id'
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    page = []
+    seen = set()
+    for pub_date, recipe_id in merge(entries, fan_out_on_read,
+                                     reverse=True):
+        if recipe_id in seen:
+            continue
+        seen.add(recipe_id)
+        page.append((pub_date, recipe_id))
+        if len(page) == limit:
+            break
+    return page
+
+
+def rebuild_timelines():
+    """Заново раскладывает последние рецепты по лентам всех подписок."""
+    TimelineEntry.objects.all().delete()
+    for user_id, author_id in Subscribe.objects.values_list(
+        'user_id', 'author_id'
+    ).iterator():
+        add_recent(user_id, author_id)
@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+from recipes import background
+from recipes.models import Recipe
+
+RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+RENDITIONS_DIR = 'recipes/renditions'
+QUALITY = 80
+
+
+def rendition_format():
+    image_format = settings.IMAGE_RENDITION_FORMAT.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def rendition_name(name, rendition):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    extension = 'jpg' if rendition_format() == 'JPEG' else 'webp'
+    return f'{RENDITIONS_DIR}/{stem}-{rendition}.{extension}'
+
+
+def render_renditions(data, image_format):
+    """Байты оригинала → {вариант: байты}; без Django, чтобы
+    можно было выполнять в отдельном процессе."""
+    with Image.open(BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        mode = 'RGB' if image_format == 'JPEG' else 'RGBA'
+        original = original.convert(mode)
+        rendered = {}
+        for rendition, size in RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            image.save(buffer, image_format, quality=QUALITY, optimize=True)
+            rendered[rendition] = buffer.getvalue()
+    return rendered
+
+
+def get_processes():
+    return background.shared_executor(
+        'processes',
+        lambda: ProcessPoolExecutor(
+            max_workers=settings.IMAGE_RENDER_PROCESSES
+        )
+    )
+
+
+def build_renditions(recipe_id, name):
+    """Пишет варианты картинки в хранилище и отмечает рецепт, если
+    картинку за это время не заменили. updated_at сдвигается вручную
+    (update() обходит auto_now): от него зависят ETag и Last-Modified
+    рецепта, а ссылка на картинку в ответе меняется."""
+    with default_storage.open(name) as original:
+        data = original.read()
+    image_format = rendition_format()
+    if settings.IMAGE_RENDER_PROCESSES:
+        rendered = get_processes().submit(
+            render_renditions, data, image_format
+        ).result()
+    else:
+        rendered = render_renditions(data, image_format)
+    for rendition, content in rendered.items():
+        path = rendition_name(name, rendition)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(content))
+    return Recipe.objects.filter(pk=recipe_id, image=name).update(
+        has_renditions=True, updated_at=timezone.now()
+    )
+
+
+def schedule_renditions(recipe):
+    """После коммита ставит обработку картинки рецепта в фоновую
+    очередь; до готовности отдается оригинал."""
+    background.on_commit(build_renditions, recipe.pk, recipe.image.name)
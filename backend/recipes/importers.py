@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+from foodgram.utils import EchoBuffer, batched
+from recipes.models import Ingredient
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(file):
+    """Читает массив объектов по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается массив JSON')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def unique_rows(rows):
+    seen = set()
+    for row in rows:
+        if row[0] and row not in seen:
+            seen.add(row)
+            yield row
+
+
+def copy_ingredients(rows, batch_size):
+    """COPY во временную таблицу и перенос без дублей одним INSERT."""
+    table = Ingredient._meta.db_table
+    writer = csv.writer(EchoBuffer())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE ingredient_import '
+            '(name varchar(200), measurement_unit varchar(200)) '
+            'ON COMMIT DROP'
+        )
+        for batch in batched(rows, batch_size):
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                io.StringIO(''.join(writer.writerow(row) for row in batch))
+            )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+
+
+def import_ingredients(rows, batch_size=1000, use_copy=False):
+    """Загружает ингредиенты в одной транзакции, возвращает число
+    прочитанных уникальных строк."""
+    total = 0
+
+    def counted(rows):
+        nonlocal total
+        for row in unique_rows(rows):
+            total += 1
+            yield row
+
+    with transaction.atomic():
+        if use_copy and connection.vendor == 'postgresql':
+            copy_ingredients(counted(rows), batch_size)
+            return total
+        for batch in batched(counted(rows), batch_size):
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in batch),
+                ignore_conflicts=True,
+            )
+    return total
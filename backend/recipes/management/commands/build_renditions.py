@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаем уменьшенные копии картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии и для уже обработанных рецептов'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(has_renditions=False)
+        built = 0
+        for recipe_id, name in recipes.values_list('pk', 'image').iterator():
+            try:
+                built += build_renditions(recipe_id, name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинки обработаны, рецептов: {built}'
+        ))
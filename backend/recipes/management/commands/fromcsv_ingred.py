@@ -1,20 +1,49 @@
-import csv
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from recipes.cache import INGREDIENTS_VERSION, bump_version
+from recipes.importers import READERS, import_ingredients
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
+    help = 'Загружаем ингредиенты из csv или json'
 
-    def handle(self, *args, **options):
-        self.load_ingredients()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='./data/ingredients.csv',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='COPY FROM STDIN, только для PostgreSQL',
+        )
 
-    def load_ingredients(self, file='ingredients.csv'):
-        file_path = f'./data/{file}'
-        with open(file_path, newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                status, created = Ingredient.objects.update_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
+    def handle(self, *args, **options):
+        path = options['path']
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        before = Ingredient.objects.count()
+        started = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as f:
+            total = import_ingredients(
+                READERS[extension](f),
+                batch_size=options['batch_size'],
+                use_copy=options['copy'],
+            )
+        elapsed = time.perf_counter() - started
+        bump_version(INGREDIENTS_VERSION)
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загрузились: {total} строк, новых {created}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с'
+        ))
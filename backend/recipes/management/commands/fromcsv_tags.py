@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from recipes.cache import TAGS_VERSION, bump_version
 from recipes.models import Tag
 
 
@@ -12,4 +13,5 @@ class Command(BaseCommand):
             {'name': 'Ужин', 'color': '#dabfc4', 'slug': 'diner'},
         ]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        bump_version(TAGS_VERSION)
         self.stdout.write(self.style.SUCCESS('Теги загрузились!'))
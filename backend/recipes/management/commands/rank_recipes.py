@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from recipes.ranking import refresh_ranking
+
+
+class Command(BaseCommand):
+    help = 'Обновляем рейтинг популярных рецептов по новым событиям'
+
+    def handle(self, *args, **options):
+        updated = refresh_ranking()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлен, рецептов затронуто: {updated}'
+        ))
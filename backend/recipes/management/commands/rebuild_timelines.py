@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобираем ленты подписок'
+
+    def handle(self, *args, **options):
+        rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS('Ленты пересобраны'))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.counters import recount
+from recipes.feed import backfill
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитываем счетчики избранного, корзин, рецептов и подписчиков'
+
+    def handle(self, *args, **options):
+        celebrities = list(User.objects.filter(
+            subscribers_count__gte=settings.FEED_CELEBRITY_SUBSCRIBERS
+        ).values_list('pk', flat=True))
+        recount(Recipe, User, Favorite, ShoppingCart, Subscribe)
+        for author_id in celebrities:
+            backfill(author_id)
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны!'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from recipes.search import reindex_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковые векторы рецептов'
+
+    def handle(self, *args, **options):
+        reindex_recipes()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс обновлен'))
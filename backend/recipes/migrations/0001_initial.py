@@ -0,0 +1,122 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:08
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AmountIngredient',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1, message='Нужно хоть немного'), django.core.validators.MaxValueValidator(50, message='Слишком долго')], verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Кол-во ингредиента',
+                'verbose_name_plural': 'Количество ингредиента',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Ингредиент')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='Единица измерения')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент',
+                'verbose_name_plural': 'Ингредиенты',
+            },
+        ),
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='recipes/image/', verbose_name='Катринка')),
+                ('name', models.CharField(max_length=200, verbose_name='Название блюда')),
+                ('text', models.TextField(verbose_name='Описание блюда')),
+                ('cooking_time', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1, message='Слишком маленькое время приготовления'), django.core.validators.MaxValueValidator(1000, message='Слишком долго')], verbose_name='Время приготовления в минутах')),
+                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('ingredients', models.ManyToManyField(related_name='recipe', through='recipes.AmountIngredient', to='recipes.Ingredient', verbose_name='Ингредиенты')),
+            ],
+            options={
+                'verbose_name': 'Рецепт',
+                'verbose_name_plural': 'Рецепты',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Тэг')),
+                ('color', models.CharField(max_length=7, unique=True, verbose_name='Цвет')),
+                ('slug', models.SlugField(max_length=200, unique=True, verbose_name='Слаг tag')),
+            ],
+            options={
+                'verbose_name': 'Тэг',
+                'verbose_name_plural': 'Теги',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShoppingCart',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to='recipes.Recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Список покупок',
+                'verbose_name_plural': 'Списки покупок',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags',
+            field=models.ManyToManyField(related_name='recipe', to='recipes.Tag', verbose_name='Тег'),
+        ),
+        migrations.CreateModel(
+            name='Favorite',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='recipes.Recipe', verbose_name='Любимый Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Избранное',
+                'verbose_name_plural': 'Избранные',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddField(
+            model_name='amountingredient',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amount_ingredient', to='recipes.Ingredient', verbose_name='Ингредиент'),
+        ),
+        migrations.AddField(
+            model_name='amountingredient',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amount_ingredient', to='recipes.Recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('recipe', 'user'), name='unique_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='amountingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_recipe'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField(verbose_name='Эпоха рейтинга')),
+                ('last_favorite_id', models.PositiveIntegerField(default=0, verbose_name='Последнее обработанное избранное')),
+                ('last_shopping_cart_id', models.PositiveIntegerField(default=0, verbose_name='Последняя обработанная корзина')),
+                ('refreshed_at', models.DateTimeField(null=True, verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Состояние рейтинга',
+                'verbose_name_plural': 'Состояние рейтинга',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeRank',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='recipes.Recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(db_index=True, default=0, verbose_name='Рейтинг')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+            },
+        ),
+    ]
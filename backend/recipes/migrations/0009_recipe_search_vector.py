@@ -0,0 +1,47 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_SQL = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector)',
+    "UPDATE recipes_recipe AS recipe SET search_vector = "
+    "setweight(to_tsvector('russian', recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    "FROM recipes_amountingredient AS amount "
+    "JOIN recipes_ingredient AS ingredient "
+    "ON ingredient.id = amount.ingredient_id "
+    "WHERE amount.recipe_id = recipe.id), '')), 'B') || "
+    "setweight(to_tsvector('russian', recipe.text), 'C')",
+)
+DROP_SQL = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector',
+)
+
+
+def run_on_postgresql(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL),
+            run_on_postgresql(DROP_SQL),
+        ),
+    ]
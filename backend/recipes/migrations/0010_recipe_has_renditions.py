@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='has_renditions',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Уменьшенные копии готовы'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rankingstate',
+            name='seen_at',
+            field=models.DateTimeField(null=True, verbose_name='Дата снимка последних id'),
+        ),
+        migrations.AddField(
+            model_name='rankingstate',
+            name='seen_favorite_id',
+            field=models.PositiveIntegerField(default=0, verbose_name='Последнее избранное на момент seen_at'),
+        ),
+        migrations.AddField(
+            model_name='rankingstate',
+            name='seen_shopping_cart_id',
+            field=models.PositiveIntegerField(default=0, verbose_name='Последняя корзина на момент seen_at'),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import (CASCADE, CharField, DateTimeField, ForeignKey,
-                              ImageField, ManyToManyField,
-                              PositiveSmallIntegerField, SlugField, TextField,
-                              UniqueConstraint)
+from django.db.models import (CASCADE, BooleanField, CharField, DateTimeField,
+                              Exists, FloatField, ForeignKey, ImageField,
+                              ManyToManyField, OneToOneField, OuterRef,
+                              PositiveIntegerField, PositiveSmallIntegerField,
+                              SlugField, TextField, UniqueConstraint, Value)
+from users.models import Subscribe
 
 User = get_user_model()
 
@@ -46,6 +49,10 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            UniqueConstraint(fields=('name', 'measurement_unit'),
+                             name='unique_ingredient')
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -53,6 +60,27 @@ class Ingredient(models.Model):
         return f'{self.name}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки одним запросом."""
+        if user.is_anonymous:
+            false = Value(False, output_field=models.BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+
 class Recipe(models.Model):
     ingredients = ManyToManyField(
         verbose_name='Ингредиенты',
@@ -69,6 +97,11 @@ class Recipe(models.Model):
         verbose_name='Катринка',
         upload_to='recipes/image/',
     )
+    has_renditions = BooleanField(
+        verbose_name='Уменьшенные копии готовы',
+        default=False,
+        editable=False,
+    )
     name = CharField(
         verbose_name='Название блюда',
         max_length=200,
@@ -95,11 +128,38 @@ class Recipe(models.Model):
         verbose_name='Дата',
         auto_now_add=True,
     )
+    updated_at = DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    favorites_count = PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} {self.author.username}'
@@ -155,6 +215,10 @@ class Favorite(models.Model):
     )
 
     class Meta:
+        constraints = [
+            UniqueConstraint(fields=('user', 'recipe'),
+                             name='unique_favorite')
+        ]
         ordering = ('id',)
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
@@ -184,9 +248,127 @@ class ShoppingCart(models.Model):
                 name='unique_cart'
             )
         ]
+        indexes = [
+            models.Index(fields=('user', 'recipe'),
+                         name='cart_user_recipe_idx'),
+        ]
         ordering = ('id',)
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
 
     def __str__(self):
         return f'{self.recipe} в списке у {self.user}'
+
+
+class RecipeRank(models.Model):
+    """Материализованный рейтинг популярности рецепта.
+
+    score хранится в шкале эпохи RankingState.epoch: вклад события
+    умножается на 2 ** (возраст эпохи / период полураспада), поэтому
+    старые очки не нужно пересчитывать, а порядок по score совпадает
+    с порядком по затухающему рейтингу на текущий момент.
+    """
+    recipe = OneToOneField(
+        Recipe,
+        on_delete=CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='rank',
+    )
+    score = FloatField(
+        verbose_name='Рейтинг',
+        default=0,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score}'
+
+
+class RankingState(models.Model):
+    """Докуда обработаны события и от какой эпохи считается score.
+
+    seen_*_id — максимальные id на момент seen_at: события до них
+    обрабатываются, когда транзакции, получившие эти id, заведомо
+    завершились."""
+    epoch = DateTimeField(
+        verbose_name='Эпоха рейтинга',
+    )
+    last_favorite_id = PositiveIntegerField(
+        verbose_name='Последнее обработанное избранное',
+        default=0,
+    )
+    last_shopping_cart_id = PositiveIntegerField(
+        verbose_name='Последняя обработанная корзина',
+        default=0,
+    )
+    seen_favorite_id = PositiveIntegerField(
+        verbose_name='Последнее избранное на момент seen_at',
+        default=0,
+    )
+    seen_shopping_cart_id = PositiveIntegerField(
+        verbose_name='Последняя корзина на момент seen_at',
+        default=0,
+    )
+    seen_at = DateTimeField(
+        verbose_name='Дата снимка последних id',
+        null=True,
+    )
+    refreshed_at = DateTimeField(
+        verbose_name='Дата пересчета',
+        null=True,
+    )
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга'
+        verbose_name_plural = 'Состояние рейтинга'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика. Строки пишутся при публикации
+    рецепта (fan-out on write); pub_date скопирована из рецепта,
+    чтобы страница ленты читалась одним проходом по индексу."""
+    user = ForeignKey(
+        User,
+        on_delete=CASCADE,
+        verbose_name='Подписчик',
+        related_name='timeline',
+    )
+    author = ForeignKey(
+        User,
+        on_delete=CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        verbose_name='Рецепт',
+        related_name='+',
+    )
+    pub_date = DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='timeline_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} в ленте у {self.user_id}'
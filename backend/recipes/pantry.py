@@ -0,0 +1,98 @@
+from collections import Counter, defaultdict
+
+from recipes.cache import VersionedIndex, bump_version, get_version
+from recipes.models import AmountIngredient
+
+PANTRY_VERSION = 'pantry'
+
+
+class PantryIndex(VersionedIndex):
+    """Разреженная матрица рецепт → ингредиенты в памяти процесса.
+
+    Для каждого ингредиента хранится множество рецептов, где он есть,
+    поэтому при подборе просматриваются только рецепты с хотя бы одним
+    ингредиентом из запроса. Изменения рецептов из этого процесса
+    применяются на месте, чужие — полной пересборкой по версии в кеше.
+    """
+    version_name = PANTRY_VERSION
+
+    def __init__(self):
+        super().__init__(({}, defaultdict(set)))
+
+    def _build(self):
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in AmountIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator():
+            ingredients[recipe_id].add(ingredient_id)
+        state = ({}, defaultdict(set))
+        for recipe_id, recipe_ingredients in ingredients.items():
+            self._add(state, recipe_id, recipe_ingredients)
+        return state
+
+    @staticmethod
+    def _add(state, recipe_id, ingredients):
+        recipes, postings = state
+        recipes[recipe_id] = frozenset(ingredients)
+        for ingredient_id in ingredients:
+            postings[ingredient_id].add(recipe_id)
+
+    @staticmethod
+    def _remove(state, recipe_id):
+        recipes, postings = state
+        for ingredient_id in recipes.pop(recipe_id, ()):
+            recipe_ids = postings[ingredient_id]
+            recipe_ids.discard(recipe_id)
+            if not recipe_ids:
+                del postings[ingredient_id]
+
+    def _change(self, recipe_id, ingredients=None):
+        with self._lock:
+            seen = get_version(PANTRY_VERSION)
+            bump_version(PANTRY_VERSION)
+            version = get_version(PANTRY_VERSION)
+            if seen != self._version or version != seen + 1:
+                return
+            self._remove(self._state, recipe_id)
+            if ingredients:
+                self._add(self._state, recipe_id, ingredients)
+            self._version = version
+
+    def update_recipe(self, recipe_id, ingredients):
+        """Заменяет ингредиенты рецепта; другие процессы пересоберут
+        индекс целиком, увидев новую версию."""
+        self._change(recipe_id, ingredients)
+
+    def remove_recipe(self, recipe_id):
+        self._change(recipe_id)
+
+    def match(self, pantry):
+        """(id рецепта, совпало, всего) по убыванию доли ингредиентов,
+        которые уже есть; рецепты без совпадений не возвращаются."""
+        self.refresh()
+        matched = Counter()
+        with self._lock:
+            recipes, postings = self._state
+            for ingredient_id in set(pantry):
+                matched.update(postings.get(ingredient_id, ()))
+            found = [
+                (recipe_id, count, len(recipes[recipe_id]))
+                for recipe_id, count in matched.items()
+            ]
+        found.sort(key=lambda item: (
+            -item[1] / item[2], item[2] - item[1], -item[0]
+        ))
+        return found
+
+    def missing(self, recipe_ids, pantry):
+        """Недостающие ингредиенты для каждого из рецептов."""
+        pantry = set(pantry)
+        with self._lock:
+            recipes, _ = self._state
+            return {
+                recipe_id: recipes.get(recipe_id, frozenset()) - pantry
+                for recipe_id in recipe_ids
+            }
+
+
+pantry_index = PantryIndex()
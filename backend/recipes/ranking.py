@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef
+from django.utils import timezone
+from foodgram.routers import use_primary
+from recipes.cache import bump_version, get_version
+from recipes.models import (Favorite, RankingState, Recipe, RecipeRank,
+                            ShoppingCart)
+
+HALF_LIFE_HOURS = 24
+FAVORITE_WEIGHT = 1.0
+SHOPPING_CART_WEIGHT = 0.5
+MAX_MULTIPLIER = 2.0 ** 64
+RANKING_VERSION = 'ranking'
+POPULAR_KEY = 'popular:{}:{}:{}'
+# Сколько ждать, пока транзакции, уже получившие id, закоммитятся.
+EVENT_SETTLE = timedelta(minutes=1)
+
+
+def multiplier(state, now):
+    age = (now - state.epoch).total_seconds()
+    return 2.0 ** (age / (HALF_LIFE_HOURS * 3600))
+
+
+def new_events(model, last_id, until_id):
+    """Число строк model с id в (last_id, until_id] по рецептам."""
+    return dict(model.objects.filter(
+        id__gt=last_id, id__lte=until_id
+    ).order_by().values_list('recipe').annotate(Count('id')))
+
+
+def max_id(model):
+    return model.objects.aggregate(Max('id'))['id__max'] or 0
+
+
+def settled_events(state, now):
+    """События, которые уже нельзя пропустить.
+
+    id выдаются не в порядке коммитов: строка с меньшим id может стать
+    видна позже строки с большим. Поэтому запуск запоминает текущие
+    максимальные id, а обрабатываются события только до id,
+    запомненных не меньше EVENT_SETTLE назад."""
+    if state.seen_at is not None and now - state.seen_at < EVENT_SETTLE:
+        return {}, {}
+    favorites, carts = {}, {}
+    if state.seen_at is not None:
+        favorites = new_events(
+            Favorite, state.last_favorite_id, state.seen_favorite_id
+        )
+        carts = new_events(
+            ShoppingCart, state.last_shopping_cart_id,
+            state.seen_shopping_cart_id
+        )
+        state.last_favorite_id = max(state.last_favorite_id,
+                                     state.seen_favorite_id)
+        state.last_shopping_cart_id = max(state.last_shopping_cart_id,
+                                          state.seen_shopping_cart_id)
+    state.seen_favorite_id = max_id(Favorite)
+    state.seen_shopping_cart_id = max_id(ShoppingCart)
+    state.seen_at = now
+    return favorites, carts
+
+
+def refresh_ranking(now=None):
+    """Добавляет в рейтинг избранное и корзины, появившиеся
+    с прошлого запуска и успевшие закоммититься (settled_events);
+    вернет число затронутых рецептов."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        state = RankingState.objects.select_for_update().filter(
+            pk=1
+        ).first() or RankingState.objects.create(pk=1, epoch=now)
+        weight = multiplier(state, now)
+        if weight > MAX_MULTIPLIER:
+            RecipeRank.objects.update(score=F('score') / weight)
+            state.epoch = now
+            weight = 1.0
+        favorites, carts = settled_events(state, now)
+        deltas = {}
+        for counts, event_weight in ((favorites, FAVORITE_WEIGHT),
+                                     (carts, SHOPPING_CART_WEIGHT)):
+            for recipe_id, count in counts.items():
+                deltas[recipe_id] = (
+                    deltas.get(recipe_id, 0) + count * event_weight * weight
+                )
+        ranks = RecipeRank.objects.in_bulk(list(deltas))
+        for recipe_id, rank in ranks.items():
+            rank.score += deltas[recipe_id]
+        RecipeRank.objects.bulk_update(ranks.values(), ('score',))
+        RecipeRank.objects.bulk_create(
+            RecipeRank(recipe_id=recipe_id, score=delta)
+            for recipe_id, delta in deltas.items()
+            if recipe_id not in ranks
+        )
+        state.refreshed_at = now
+        state.save()
+    if deltas:
+        bump_version(RANKING_VERSION)
+    return len(deltas)
+
+
+def popular_recipes(tag=None):
+    queryset = Recipe.objects.filter(rank__isnull=False)
+    if tag:
+        queryset = queryset.annotate(
+            has_tag=Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug=tag
+            ))
+        ).filter(has_tag=True)
+    return queryset.order_by('-rank__score', '-id')
+
+
+def get_popular(tag, limit, serialize):
+    """Топ рецептов (по тегу) из кеша; serialize строит ответ."""
+    key = POPULAR_KEY.format(tag or '', limit, get_version(RANKING_VERSION))
+    payload = cache.get(key)
+    if payload is None:
+        with use_primary():
+            payload = serialize(popular_recipes(tag)[:limit])
+        cache.set(key, payload)
+    return payload
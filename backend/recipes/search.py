@@ -0,0 +1,144 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from recipes.cache import VersionedIndex, bump_version
+from recipes.models import AmountIngredient, Recipe
+
+SEARCH_CONFIG = 'russian'
+SEARCH_VERSION = 'recipe_search'
+SEARCH_LIMIT = 1000
+WORD = re.compile(r'\w+')
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+
+def tokenize(value):
+    return WORD.findall(value.casefold())
+
+
+def build_vector(name, text, ingredients):
+    return (
+        SearchVector(Value(name), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(' '.join(ingredients)), weight='B',
+                       config=SEARCH_CONFIG)
+        + SearchVector(Value(text), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def recipe_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for recipe_id, name in AmountIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient__name'):
+        ingredients[recipe_id].append(name)
+    return ingredients
+
+
+def index_recipe(recipe):
+    """Обновляет поисковый вектор рецепта после изменения."""
+    if connection.vendor == 'postgresql':
+        ingredients = recipe_ingredients([recipe.pk])[recipe.pk]
+        Recipe.objects.filter(pk=recipe.pk).update(
+            search_vector=build_vector(recipe.name, recipe.text, ingredients)
+        )
+    bump_version(SEARCH_VERSION)
+
+
+def reindex_recipes(batch_size=500):
+    if connection.vendor == 'postgresql':
+        recipes = Recipe.objects.order_by('pk').values_list(
+            'pk', 'name', 'text'
+        )
+        for start in range(0, recipes.count(), batch_size):
+            batch = list(recipes[start:start + batch_size])
+            ingredients = recipe_ingredients(
+                [recipe_id for recipe_id, *_ in batch]
+            )
+            for recipe_id, name, text in batch:
+                Recipe.objects.filter(pk=recipe_id).update(
+                    search_vector=build_vector(
+                        name, text, ingredients[recipe_id]
+                    )
+                )
+    bump_version(SEARCH_VERSION)
+
+
+class RecipeSearchIndex(VersionedIndex):
+    """Инвертированный индекс рецептов в памяти для баз без
+    полнотекстового поиска. Слова запроса ищутся как префиксы
+    слов рецепта, все слова запроса должны найтись."""
+    version_name = SEARCH_VERSION
+
+    def __init__(self):
+        super().__init__(((), {}))
+
+    def _build(self):
+        postings = defaultdict(dict)
+        recipes = Recipe.objects.values_list('pk', 'name', 'text')
+        ingredients = recipe_ingredients(
+            Recipe.objects.values('pk')
+        )
+        for recipe_id, name, text in recipes.iterator():
+            fields = {
+                'name': name,
+                'ingredients': ' '.join(ingredients[recipe_id]),
+                'text': text,
+            }
+            for field, value in fields.items():
+                for token in tokenize(value):
+                    scores = postings[token]
+                    scores[recipe_id] = (
+                        scores.get(recipe_id, 0) + WEIGHTS[field]
+                    )
+        return tuple(sorted(postings)), dict(postings)
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """id рецептов по убыванию релевантности."""
+        self.refresh()
+        vocabulary, postings = self._state
+        ranks = None
+        for term in set(tokenize(query)):
+            scores = defaultdict(float)
+            position = bisect_left(vocabulary, term)
+            while (position < len(vocabulary)
+                   and vocabulary[position].startswith(term)):
+                for recipe_id, score in postings[
+                    vocabulary[position]
+                ].items():
+                    scores[recipe_id] += score
+                position += 1
+            if ranks is None:
+                ranks = scores
+            else:
+                ranks = {
+                    recipe_id: rank + scores[recipe_id]
+                    for recipe_id, rank in ranks.items()
+                    if recipe_id in scores
+                }
+        if not ranks:
+            return []
+        return sorted(ranks, key=lambda recipe_id: -ranks[recipe_id])[:limit]
+
+
+recipe_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """Оставляет в queryset найденные рецепты по убыванию релевантности."""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    found = recipe_index.search(query)
+    return queryset.filter(pk__in=found).annotate(
+        search_rank=Case(
+            *(When(pk=recipe_id, then=Value(-position))
+              for position, recipe_id in enumerate(found)),
+            output_field=IntegerField(),
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
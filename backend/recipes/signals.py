@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.cache import (AUTHOR_VERSION, INGREDIENTS_VERSION, TAGS_VERSION,
+                           bump_modified, bump_shopping_cart_version,
+                           bump_version)
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from recipes.pantry import PANTRY_VERSION, pantry_index
+from recipes.search import SEARCH_VERSION
+from users.models import User
+
+# Поля автора, которые показывает рецепт (BaseUserSerializer).
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    bump_shopping_cart_version(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, signal, **kwargs):
+    bump_modified(INGREDIENTS_VERSION)
+    if signal is post_delete:
+        bump_version(PANTRY_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_modified(TAGS_VERSION)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & update_fields):
+        return
+    bump_modified(AUTHOR_VERSION.format(instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    bump_version(SEARCH_VERSION)
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: pantry_index.remove_recipe(recipe_id))
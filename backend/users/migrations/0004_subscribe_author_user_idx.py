@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20230302_1540'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscribe',
+            options={'ordering': ['-id'], 'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['author', 'user'], name='subscribe_author_user_idx'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models import (CASCADE, CharField, EmailField, ForeignKey,
-                              UniqueConstraint)
+                              PositiveIntegerField, UniqueConstraint)
 
 
 class User(AbstractUser):
@@ -25,6 +25,16 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Фамилия'
     )
+    recipes_count = PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    subscribers_count = PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
 
     class Meta:
         ordering = ('id', )
@@ -59,3 +69,7 @@ class Subscribe(models.Model):
                 name='unique_subscribe'
             ),
         )
+        indexes = (
+            models.Index(fields=('author', 'user'),
+                         name='subscribe_author_user_idx'),
+        )